@@ -1,20 +1,30 @@
 from dotenv import load_dotenv
+
+# Load .env variables (for Gmail credentials, etc.) before tools read their settings
+load_dotenv()
+
 from livekit import agents
 from livekit.agents import AgentSession, Agent, RoomInputOptions
 from livekit.plugins import noise_cancellation, google
-from prompts import AGENT_INSTRUCTIONS, SESSION_INSTRUCTIONS
+from prompts import AGENT_INSTRUCTIONS, SESSION_INSTRUCTIONS, DEFAULT_CITY_INSTRUCTIONS
 
 # Import all tools from tools.py
 from tools import (
     get_weather,
     send_email,
+    send_bulk_email,
+    get_email_status,
     search_web,
     add_task,
     list_tasks,
+    complete_task,
+    delete_task,
     clear_tasks,
     find_and_read_file,
+    search_file_contents,
     write_note,
     show_notes,
+    search_notes,
     generate_password,
     get_system_info,
     solve_math,
@@ -26,15 +36,25 @@ from tools import (
     set_timer,
     get_calendar_events,
     add_calendar_event,
+    prefetch_weather,
+    flush_stores,
+    file_index,
+    system_monitor,
+    math_pool,
 )
 
+import atexit
+import http_client
+import metrics
+import mailer
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Load .env variables (for Gmail credentials, etc.)
-load_dotenv()
+# The shared HTTP client lives as long as the worker process, across jobs
+atexit.register(http_client.close)
 
 # Define your Assistant Agent
 class Assistant(Agent):
@@ -48,13 +68,19 @@ class Assistant(Agent):
             tools=[
                 get_weather,
                 send_email,
+                send_bulk_email,
+                get_email_status,
                 search_web,
                 add_task,
                 list_tasks,
+                complete_task,
+                delete_task,
                 clear_tasks,
                 find_and_read_file,
+                search_file_contents,
                 write_note,
                 show_notes,
+                search_notes,
                 generate_password,
                 get_system_info,
                 solve_math,
@@ -73,6 +99,33 @@ class Assistant(Agent):
 async def entrypoint(ctx: agents.JobContext):
     session = AgentSession()
 
+    # Optionally warm the weather cache while the room connects, since the
+    # greeting offers the weather straight away
+    instructions = SESSION_INSTRUCTIONS
+    default_city = os.getenv("DEFAULT_WEATHER_CITY")
+    if default_city:
+        prefetch_weather(default_city)
+        instructions += DEFAULT_CITY_INSTRUCTIONS.format(city=default_city)
+
+    # Start (or keep) the background filename index, system stats sampler and warm math workers
+    file_index.start()
+    system_monitor.start()
+    math_pool.start()
+
+    # Self-metrics: flag anything that blocks the event loop, and optionally
+    # serve tool latencies and cache counters for Prometheus
+    metrics.start_loop_watch(
+        interval=float(os.getenv("LOOP_LAG_INTERVAL", "0.5")),
+        threshold=float(os.getenv("LOOP_LAG_THRESHOLD", "0.1")),
+    )
+    if os.getenv("METRICS_PORT"):
+        metrics.serve(int(os.getenv("METRICS_PORT")))
+
+    # Flush queued mail and tasks when the job ends. The pooled HTTP client is
+    # shared by every job in this process, so it is only closed at process exit.
+    ctx.add_shutdown_callback(mailer.ashutdown)
+    ctx.add_shutdown_callback(flush_stores)
+
     await session.start(
         room=ctx.room,
         agent=Assistant(),
@@ -83,7 +136,7 @@ async def entrypoint(ctx: agents.JobContext):
     )
 
     await ctx.connect()
-    await session.generate_reply(instructions=SESSION_INSTRUCTIONS)
+    await session.generate_reply(instructions=instructions)
 
 # Run the agent
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def normalize_key(text: str) -> str:
+    """Normalize spoken text (a city, a search query) for use as a cache key."""
+    return " ".join(text.lower().split()).strip(" .,!?")
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    `get_or_fetch` adds single-flight deduplication: concurrent callers asking
+    for the same missing key share one upstream fetch instead of racing.
+    `on_evict`, if given, is called with every value that leaves the cache
+    (evicted, expired, replaced or cleared), e.g. to release file handles.
+    """
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: float = 600.0, on_evict: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self._dropped(value)
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or `default`."""
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def _dropped(self, value: Any) -> None:
+        if self.on_evict is not None:
+            try:
+                self.on_evict(value)
+            except Exception as e:
+                logging.error(f"[ERROR] {self.name} cache eviction callback failed: {e}")
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        old = self._data.get(key)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if old is not None and old[1] is not value:
+            self._dropped(old[1])
+        while len(self._data) > self.maxsize:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self.evictions += 1
+            self._dropped(evicted)
+
+    def purge(self) -> int:
+        """Drop every expired entry now rather than on its next lookup; returns how many."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            self._dropped(self._data.pop(key)[1])
+        return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        values = [value for _, value in self._data.values()]
+        self._data.clear()
+        for value in values:
+            self._dropped(value)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for `key`, or run `fetch()` once and cache its result.
+
+        Exceptions from `fetch` propagate to every waiter and are not cached.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_fetched(key, t))
+        # Shield so one caller being cancelled doesn't abort the shared fetch
+        return await asyncio.shield(task)
+
+    def _on_fetched(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        exc = task.exception()  # also marks the exception as retrieved
+        if exc is None:
+            self.set(key, task.result())
+        else:
+            logging.debug(f"[DEBUG] {self.name} cache fetch failed for {key!r}: {exc}")
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
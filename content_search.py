@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional
+
+from file_reader import looks_like_text, mapped
+
+# Grep-style search through file contents. Each file is memory-mapped and the
+# pattern runs over the mapping directly, so no file is copied into memory as a
+# whole. Several workers scan files in parallel and all of them stop as soon as
+# enough matching files have been found.
+
+# Never text, so not worth opening (is_text_file would reject them anyway)
+SKIP_EXTENSIONS = frozenset(
+    ".jpg .jpeg .png .gif .bmp .webp .heic .ico .mp3 .wav .flac .m4a .ogg .mp4 .mkv .avi .mov "
+    ".zip .7z .rar .gz .tar .iso .exe .dll .msi .bin .pdf .docx .xlsx .pptx".split()
+)
+BINARY_CHECK_BYTES = 512
+
+
+class LineHit(NamedTuple):
+    line_no: int
+    line: str
+    before: str
+    after: str
+
+
+class FileHits(NamedTuple):
+    path: str
+    hits: List[LineHit]
+
+
+def compile_query(query: str) -> "re.Pattern[bytes]":
+    """Case-insensitive literal pattern; any run of whitespace in the query matches any other."""
+    words = [re.escape(w.encode("utf-8")) for w in query.split()]
+    return re.compile(rb"\s+".join(words), re.IGNORECASE)
+
+
+def _line_at(mm, start: int, end: int) -> str:
+    return mm[start:end].decode("utf-8", errors="replace").strip()
+
+
+def scan_file(path: str, pattern: "re.Pattern[bytes]", max_hits: int = 3, max_bytes: Optional[int] = None) -> List[LineHit]:
+    """Matching lines of one file (at most one hit per line), with a line of context each side."""
+    try:
+        if max_bytes is not None and os.path.getsize(path) > max_bytes:
+            return []
+        with mapped(path) as mm:
+            if not looks_like_text(mm[:BINARY_CHECK_BYTES]):
+                return []
+            hits: List[LineHit] = []
+            line_no, counted_to = 1, 0
+            pos = 0
+            while len(hits) < max_hits:
+                match = pattern.search(mm, pos)
+                if match is None:
+                    break
+                start = mm.rfind(b"\n", 0, match.start()) + 1
+                end = mm.find(b"\n", match.end())
+                end = len(mm) if end == -1 else end
+                # Count newlines only over the stretch since the previous hit
+                line_no += mm[counted_to:start].count(b"\n")
+                counted_to = start
+                before = after = ""
+                if start:
+                    before = _line_at(mm, mm.rfind(b"\n", 0, start - 1) + 1, start - 1)
+                if end < len(mm):
+                    next_end = mm.find(b"\n", end + 1)
+                    after = _line_at(mm, end + 1, len(mm) if next_end == -1 else next_end)
+                hits.append(LineHit(line_no, _line_at(mm, start, end), before, after))
+                pos = end + 1
+            return hits
+    except (OSError, ValueError) as e:
+        logging.debug(f"[DEBUG] Skipping {path} in content search: {e}")
+        return []
+
+
+class ContentSearch:
+    """One content search across many files.
+
+    `run` returns up to `limit` files with hits, most hits first. The
+    workers share one path iterator and stop early once `limit` files have
+    matched, when `budget` seconds have passed (`timed_out` is then set),
+    or when `cancel` is set.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        limit: int = 5,
+        max_hits: int = 3,
+        workers: int = 4,
+        budget: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        cancel: Optional[threading.Event] = None,
+    ):
+        self.pattern = compile_query(query)
+        self.limit = limit
+        self.max_hits = max_hits
+        self.workers = workers
+        self.budget = budget
+        self.max_bytes = max_bytes
+        self.cancel = cancel or threading.Event()
+        self.timed_out = False
+        self.files_scanned = 0
+        self._lock = threading.Lock()
+        self._results: List[FileHits] = []
+
+    def _worker(self, paths, deadline: Optional[float]) -> None:
+        while not self.cancel.is_set():
+            if deadline is not None and time.monotonic() > deadline:
+                self.timed_out = True
+                self.cancel.set()
+                return
+            with self._lock:
+                path = next(paths, None)
+                if path is None:
+                    return
+                self.files_scanned += 1
+            if os.path.splitext(path)[1].lower() in SKIP_EXTENSIONS:
+                continue
+            hits = scan_file(path, self.pattern, self.max_hits, self.max_bytes)
+            if hits:
+                with self._lock:
+                    if len(self._results) < self.limit:
+                        self._results.append(FileHits(path, hits))
+                    if len(self._results) >= self.limit:
+                        self.cancel.set()
+
+    def run(self, paths: Iterable[str]) -> List[FileHits]:
+        deadline = None if self.budget is None else time.monotonic() + self.budget
+        shared = iter(paths)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="content-search") as pool:
+            for future in [pool.submit(self._worker, shared, deadline) for _ in range(self.workers)]:
+                future.result()
+        return sorted(self._results, key=lambda r: len(r.hits), reverse=True)
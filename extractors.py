@@ -0,0 +1,239 @@
+import html
+import itertools
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from file_reader import Chunk
+
+# Text extraction for documents that is_text_file would reject (or that read
+# badly as raw markup). Each extractor yields text a page (or sheet, or block)
+# at a time, so only as much of a document is parsed as the reader asks for.
+# The parsing libraries are optional; a format is only readable when its
+# package is installed.
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+STREAM_BLOCK = 64 * 1024
+
+
+class MissingDependency(Exception):
+    """The package needed to read this format is not installed."""
+
+    def __init__(self, package: str):
+        super().__init__(package)
+        self.package = package
+
+
+class Extractor(NamedTuple):
+    pages: Callable[[str], Iterator[str]]
+    package: Optional[str]
+    available: bool
+
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register(*extensions: str, package: Optional[str] = None, available: bool = True):
+    """Register a page generator for the given file extensions."""
+    def wrap(fn: Callable[[str], Iterator[str]]):
+        for ext in extensions:
+            EXTRACTORS[ext.lower()] = Extractor(fn, package, available)
+        return fn
+    return wrap
+
+
+def get_extractor(path: str) -> Optional[Extractor]:
+    return EXTRACTORS.get(os.path.splitext(path)[1].lower())
+
+
+# --- formats ---
+@register(".pdf", package="pypdf", available=PdfReader is not None)
+def pdf_pages(path: str) -> Iterator[str]:
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield f"[Page {number}]\n{(page.extract_text() or '').strip()}\n\n"
+
+
+@register(".docx", package="python-docx", available=docx is not None)
+def docx_pages(path: str) -> Iterator[str]:
+    document = docx.Document(path)
+    for paragraph in document.paragraphs:
+        if paragraph.text.strip():
+            yield paragraph.text + "\n"
+    for table in document.tables:
+        for row in table.rows:
+            yield "\t".join(cell.text.strip() for cell in row.cells) + "\n"
+
+
+@register(".xlsx", ".xlsm", package="openpyxl", available=openpyxl is not None)
+def xlsx_pages(path: str) -> Iterator[str]:
+    # Streamed from disk so memory stays bounded; the read-only workbook holds the
+    # file open until the generator is closed (Extraction.close, or cache eviction)
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield f"[Sheet {sheet.title}]\n"
+            for row in sheet.iter_rows(values_only=True):
+                if any(value is not None for value in row):
+                    yield "\t".join("" if value is None else str(value) for value in row) + "\n"
+            yield "\n"
+    finally:
+        workbook.close()
+
+
+class _TextParser(HTMLParser):
+    SKIP = {"script", "style", "head", "noscript"}
+    BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skipping += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping and data.strip():
+            self.parts.append(" ".join(data.split()) + " ")
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts.clear()
+        return re.sub(r" *\n[\s]*", "\n", text)
+
+
+@register(".html", ".htm")
+def html_pages(path: str) -> Iterator[str]:
+    parser = _TextParser()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(STREAM_BLOCK)
+            if not block:
+                break
+            parser.feed(block)
+            text = parser.take()
+            if text.strip():
+                yield text
+    parser.close()
+    yield parser.take()
+
+
+_MD_RULES = [
+    (re.compile(r"^\s*```.*$"), ""),                   # code fences
+    (re.compile(r"^\s{0,3}#{1,6}\s*"), ""),            # headings
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),   # links and images -> their text
+    (re.compile(r"(?<!\w)(\*\*|__|\*|_|`)(\S(?:.*?\S)?)\1(?!\w)"), r"\2"),  # emphasis and inline code
+    (re.compile(r"^\s*>\s?"), ""),                     # block quotes
+]
+
+
+@register(".md", ".markdown")
+def markdown_pages(path: str) -> Iterator[str]:
+    lines: List[str] = []
+    size = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            for pattern, replacement in _MD_RULES:
+                line = pattern.sub(replacement, line)
+            lines.append(html.unescape(line))
+            size += len(line)
+            if size >= STREAM_BLOCK:
+                yield "".join(lines)
+                lines, size = [], 0
+    yield "".join(lines)
+
+
+class Extraction:
+    """Text extracted from one document so far.
+
+    Pages are pulled from the extractor only when a read reaches past what is
+    already extracted, and kept for later reads of the same document. `close`
+    releases the extractor (and any file it holds open); a later read that
+    needs more text starts it again and skips the pages already extracted.
+    """
+
+    def __init__(self, path: str, extractor: Extractor):
+        if not extractor.available:
+            raise MissingDependency(extractor.package)
+        self.path = path
+        self._extractor = extractor
+        self._generator: Optional[Iterator[str]] = None
+        self._pages: Optional[Iterator[str]] = None
+        self._page_count = 0
+        self._parts: List[str] = []
+        self._length = 0
+        self.done = False
+        self._lock = threading.Lock()
+
+    def _extend(self, upto: Optional[int]) -> None:
+        while not self.done and (upto is None or self._length < upto):
+            if self._pages is None:
+                self._generator = self._extractor.pages(self.path)
+                self._pages = itertools.islice(self._generator, self._page_count, None)
+            try:
+                page = next(self._pages)
+            except StopIteration:
+                self.done = True
+                self._generator = self._pages = None
+                break
+            self._parts.append(page)
+            self._page_count += 1
+            self._length += len(page)
+
+    def close(self) -> None:
+        """Stop the extractor so it lets go of the file."""
+        with self._lock:
+            if self._generator is not None:
+                # Runs the generator's finally/with blocks, closing its file
+                self._generator.close()
+                self._generator = self._pages = None
+
+    def _text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def read(self, offset: int = 0, budget: int = 4000) -> Chunk:
+        """Up to `budget` characters from `offset`; size is None until the whole document is extracted."""
+        with self._lock:
+            self._extend(offset + budget + 1)
+            return self._slice(max(offset, 0), budget)
+
+    def read_tail(self, budget: int = 4000) -> Chunk:
+        with self._lock:
+            self._extend(None)
+            return self._slice(max(self._length - budget, 0), budget)
+
+    def _slice(self, start: int, budget: int) -> Chunk:
+        text = self._text()
+        start = min(start, len(text))
+        end = min(start + budget, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start + budget // 2, end)
+            if newline != -1:
+                end = newline + 1
+        return Chunk(text[start:end], start, end, len(text) if self.done else None)
@@ -0,0 +1,90 @@
+import codecs
+import mmap
+import os
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional, Union
+
+# Bounded views into text files of any size. Files are memory-mapped and only
+# the bytes being shown are touched, so a multi-GB log costs no more to peek at
+# than a small one. Views never split a UTF-8 sequence and prefer to break on
+# line boundaries.
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+    # None while the total is not known yet (documents still being extracted)
+    size: Optional[int]
+
+    @property
+    def more(self) -> bool:
+        return self.size is None or self.end < self.size
+
+
+def looks_like_text(head: bytes) -> bool:
+    """The first block of a file is text if it has no NUL bytes and decodes as UTF-8.
+
+    A multi-byte character cut off at the end of the block does not count
+    against it.
+    """
+    if b"\0" in head:
+        return False
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+@contextmanager
+def mapped(path: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _is_continuation(mm, pos: int) -> bool:
+    return 0 <= pos < len(mm) and mm[pos] & 0xC0 == 0x80
+
+
+def _view(mm, start: int, end: int) -> Chunk:
+    size = len(mm)
+    while _is_continuation(mm, start) and start < end:
+        start += 1
+    while end < size and _is_continuation(mm, end) and end > start:
+        end -= 1
+    return Chunk(mm[start:end].decode("utf-8", errors="replace"), start, end, size)
+
+
+def read_range(path: str, offset: int = 0, budget: int = 4000) -> Chunk:
+    """Up to `budget` bytes from `offset`, ending on a line break when one is near."""
+    with mapped(path) as mm:
+        size = len(mm)
+        start = min(max(offset, 0), size)
+        end = min(start + budget, size)
+        if end < size:
+            newline = mm.rfind(b"\n", start + budget // 2, end)
+            if newline != -1:
+                end = newline + 1
+        return _view(mm, start, end)
+
+
+def read_head(path: str, budget: int = 4000) -> Chunk:
+    return read_range(path, 0, budget)
+
+
+def read_tail(path: str, budget: int = 4000) -> Chunk:
+    """The last `budget` bytes, starting on a line break when one is near."""
+    with mapped(path) as mm:
+        size = len(mm)
+        start = max(size - budget, 0)
+        if start > 0:
+            newline = mm.find(b"\n", start, start + budget // 2)
+            if newline != -1:
+                start = newline + 1
+        return _view(mm, start, size)
@@ -0,0 +1,322 @@
+import fnmatch
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from filename_match import name_keys, parse_spoken, query_keys, score
+from storage import atomic_write_json
+
+# Directories that are never worth descending into when looking for a user's file
+DEFAULT_IGNORE = (
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    "venv",
+    "env",
+    ".tox",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".cache",
+    "site-packages",
+    "$RECYCLE.BIN",
+    "System Volume Information",
+    "AppData",
+)
+
+
+def ignore_patterns() -> List[str]:
+    """Default ignore patterns plus any from FILE_SEARCH_IGNORE (comma separated)."""
+    extra = os.getenv("FILE_SEARCH_IGNORE", "")
+    return list(DEFAULT_IGNORE) + [p.strip() for p in extra.split(",") if p.strip()]
+
+
+class BoundedWalk:
+    """Depth-limited, pruned directory walk built on os.scandir.
+
+    Iterating yields an os.DirEntry for each file. Directories deeper than
+    `max_depth` below `root`, or matching an ignore pattern, are never opened,
+    and the walk stops once `budget` seconds have passed (`timed_out` is then
+    set) or `cancel` is set. Folders listed in `exclude` are skipped, which lets
+    parallel walkers over nested roots avoid covering the same ground. DirEntry
+    caches the file type from the directory listing, so no extra stat calls are
+    made.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_depth: int = 5,
+        ignore: Optional[Iterable[str]] = None,
+        budget: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+        exclude: Iterable[str] = (),
+    ):
+        self.root = os.path.abspath(root)
+        self.max_depth = max_depth
+        self.ignore = list(ignore_patterns() if ignore is None else ignore)
+        self.budget = budget
+        self.cancel = cancel
+        self.exclude = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+        self.timed_out = False
+        self.dirs_scanned = 0
+
+    def _ignored(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def __iter__(self) -> Iterator[os.DirEntry]:
+        deadline = None if self.budget is None else time.monotonic() + self.budget
+        stack = [(self.root, 0)]
+        while stack:
+            if deadline is not None and time.monotonic() > deadline:
+                self.timed_out = True
+                logging.debug(f"[DEBUG] Walk of {self.root} stopped after {self.budget}s budget")
+                return
+            if self.cancel is not None and self.cancel.is_set():
+                return
+            path, depth = stack.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError as e:
+                logging.debug(f"[DEBUG] Skipping {path}: {e}")
+                continue
+            self.dirs_scanned += 1
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Prune here instead of descending and discarding later
+                        if depth < self.max_depth and not self._ignored(entry.name) and os.path.normcase(entry.path) not in self.exclude:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+            # Reverse so the walk visits subdirectories in listing order
+            stack.extend((sub, depth + 1) for sub in reversed(subdirs))
+
+
+# Folders infer_path_from_natural_language maps spoken names onto
+USER_FOLDERS = ("Documents", "Downloads", "Desktop", "Pictures", "Music", "Videos")
+
+
+def home_dir() -> str:
+    return os.environ.get("USERPROFILE") or os.path.expanduser("~")
+
+
+def default_roots() -> List[str]:
+    """The user's well-known folders that exist on this machine."""
+    return [p for p in (os.path.join(home_dir(), name) for name in USER_FOLDERS) if os.path.isdir(p)]
+
+
+def _is_under(path: str, root: str) -> bool:
+    root = os.path.normcase(os.path.abspath(root))
+    path = os.path.normcase(os.path.abspath(path))
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def nested_roots(root: str, roots: List[str]) -> List[str]:
+    """The other roots lying inside `root`, for a walker of `root` to skip."""
+    return [r for r in roots if r != root and _is_under(r, root)]
+
+
+class FileIndex:
+    """Filename index over the user's folders, persisted to disk.
+
+    The index remembers every directory's mtime together with its file and
+    subdirectory names. A rescan only stats directories and re-lists the
+    ones whose mtime changed, which is when entries were added, removed or
+    renamed, so keeping the index fresh is cheap. Lookups are a dict hit on
+    the lowercased filename.
+    """
+
+    def __init__(self, path: str, roots: Optional[List[str]] = None, max_depth: int = 12, interval: float = 300.0):
+        self.path = path
+        self.roots = [os.path.abspath(r) for r in (roots if roots is not None else default_roots())]
+        self.max_depth = max_depth
+        self.interval = interval
+        self.ignore = ignore_patterns()
+        self._lock = threading.Lock()
+        # dirpath -> [mtime_ns, [file names], [subdir names]]
+        self._dirs: Dict[str, list] = {}
+        self._names: Dict[str, Set[str]] = {}
+        # fuzzy blocking key -> lowercased names carrying it
+        self._keys: Dict[str, Set[str]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+        self.last_scan = 0.0
+
+    # --- name table ---
+    def _add_names(self, dirpath: str, files: List[str]) -> None:
+        for name in files:
+            lowered = name.lower()
+            self._names.setdefault(lowered, set()).add(os.path.join(dirpath, name))
+            # Keys come from the on-disk spelling so camelCase names split into words
+            for key in name_keys(name):
+                self._keys.setdefault(key, set()).add(lowered)
+
+    def _remove_names(self, dirpath: str, files: List[str]) -> None:
+        for name in files:
+            lowered = name.lower()
+            paths = self._names.get(lowered)
+            if paths is None:
+                continue
+            spellings = {os.path.basename(p) for p in paths} | {name}
+            paths.discard(os.path.join(dirpath, name))
+            if paths:
+                continue
+            del self._names[lowered]
+            for key in set().union(*(name_keys(s) for s in spellings)):
+                names = self._keys.get(key)
+                if names is not None:
+                    names.discard(lowered)
+                    if not names:
+                        del self._keys[key]
+
+    # --- persistence ---
+    def load(self) -> None:
+        """Load the saved index so lookups work before the first rescan finishes."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"[ERROR] Could not load file index {self.path}: {e}")
+            return
+        dirs = {d: v for d, v in data.get("dirs", {}).items() if any(_is_under(d, r) for r in self.roots)}
+        with self._lock:
+            self._dirs = dirs
+            self._names = {}
+            self._keys = {}
+            for dirpath, (_, files, _) in dirs.items():
+                self._add_names(dirpath, files)
+        self.last_scan = data.get("scanned", 0.0)
+        self.ready.set()
+        logging.debug(f"[DEBUG] Loaded file index with {len(dirs)} folder(s) from {self.path}")
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"scanned": self.last_scan, "dirs": dict(self._dirs)}
+        try:
+            atomic_write_json(self.path, data)
+        except OSError as e:
+            logging.error(f"[ERROR] Could not save file index {self.path}: {e}")
+
+    # --- scanning ---
+    def rescan(self) -> int:
+        """Bring the index up to date; returns how many folders were re-listed."""
+        started = time.monotonic()
+        seen = set()
+        relisted = 0
+        stack = [(root, 0) for root in self.roots]
+        while stack and not self._stop.is_set():
+            dirpath, depth = stack.pop()
+            try:
+                mtime = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(dirpath)
+            cached = self._dirs.get(dirpath)
+            if cached is None or cached[0] != mtime:
+                files, subdirs = [], []
+                try:
+                    with os.scandir(dirpath) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    if not any(fnmatch.fnmatch(entry.name, p) for p in self.ignore):
+                                        subdirs.append(entry.name)
+                                elif entry.is_file():
+                                    files.append(entry.name)
+                            except OSError:
+                                continue
+                except OSError as e:
+                    logging.debug(f"[DEBUG] Skipping {dirpath}: {e}")
+                    continue
+                with self._lock:
+                    if cached is not None:
+                        self._remove_names(dirpath, cached[1])
+                    self._dirs[dirpath] = [mtime, files, subdirs]
+                    self._add_names(dirpath, files)
+                relisted += 1
+                cached = self._dirs[dirpath]
+            if depth < self.max_depth:
+                stack.extend((os.path.join(dirpath, sub), depth + 1) for sub in cached[2])
+        if not self._stop.is_set():
+            # Forget folders that have disappeared
+            with self._lock:
+                for dirpath in [d for d in self._dirs if d not in seen]:
+                    self._remove_names(dirpath, self._dirs.pop(dirpath)[1])
+        self.last_scan = time.time()
+        self.ready.set()
+        logging.debug(f"[DEBUG] File index rescan: {len(seen)} folder(s), {relisted} re-listed in {time.monotonic() - started:.2f}s")
+        return relisted
+
+    def _run(self) -> None:
+        self.load()
+        while not self._stop.is_set():
+            try:
+                if self.rescan():
+                    self.save()
+            except Exception as e:
+                logging.error(f"[ERROR] File index rescan failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "FileIndex":
+        """Build and refresh the index in a background thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="file-index", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # --- lookups ---
+    def covers(self, directory: str) -> bool:
+        """True if `directory` lies inside one of the indexed roots."""
+        return any(_is_under(directory, root) for root in self.roots)
+
+    def lookup(self, filename: str, under: Optional[str] = None) -> List[str]:
+        """Paths whose name matches `filename` exactly (case-insensitive)."""
+        with self._lock:
+            paths = list(self._names.get(filename.lower(), ()))
+        if under:
+            paths = [p for p in paths if _is_under(p, under)]
+        return sorted(paths, key=lambda p: (p.count(os.sep), p))
+
+    def paths(self, under: Optional[str] = None) -> List[str]:
+        """Every indexed file path (optionally only those inside `under`), shallowest folders first."""
+        with self._lock:
+            dirs = [(d, list(files)) for d, (_, files, _) in self._dirs.items() if under is None or _is_under(d, under)]
+        dirs.sort(key=lambda item: (item[0].count(os.sep), item[0]))
+        return [os.path.join(d, name) for d, files in dirs for name in files]
+
+    def fuzzy(self, text: str, limit: int = 5, under: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Best (path, score) matches for a spoken or misheard file name.
+
+        Candidates come from the blocking-key table, so only names sharing a
+        token, a prefix or a Soundex code with the query are ranked.
+        """
+        spoken = parse_spoken(text)
+        with self._lock:
+            names = set()
+            for key in query_keys(spoken):
+                names.update(self._keys.get(key, ()))
+            candidates = {n: list(self._names[n]) for n in names}
+        if under:
+            candidates = {n: [p for p in paths if _is_under(p, under)] for n, paths in candidates.items()}
+        # Score the on-disk spelling so camelCase names still split into words
+        scored = ((score(spoken, os.path.basename(p)), p) for paths in candidates.values() for p in paths)
+        best = heapq.nlargest(limit, scored, key=lambda item: (item[0], -item[1].count(os.sep)))
+        return [(p, s) for s, p in best if s > 0]
@@ -0,0 +1,123 @@
+import os
+import re
+from typing import List, NamedTuple, Optional, Set
+
+# Ranked matching of spoken file names ("quarterly report dot pdf") against real
+# ones ("Quarterly_Report_2024.pdf"), combining normalized tokens, edit distance
+# and Soundex keys.
+
+SPOKEN_SYMBOLS = [
+    (r"\bdot\b", "."),
+    (r"\bperiod\b", "."),
+    (r"\bunderscore\b", "_"),
+    (r"\b(?:dash|hyphen)\b", "-"),
+]
+FILLER_WORDS = {"the", "a", "an", "file", "called", "named", "my"}
+_SPLIT_RE = re.compile(r"[\W_]+|(?<=[a-z])(?=[A-Z])|(?<=[A-Za-z])(?=\d)|(?<=\d)(?=[A-Za-z])")
+_SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"]) for c in letters}
+
+
+class SpokenName(NamedTuple):
+    tokens: List[str]
+    ext: Optional[str]
+
+
+def split_tokens(name: str) -> List[str]:
+    """Split a file stem into lowercase word/number tokens (handles camelCase and digits)."""
+    return [t.lower() for t in _SPLIT_RE.split(name) if t]
+
+
+def soundex(word: str) -> str:
+    """Classic four-character Soundex key; digits are kept as-is."""
+    if not word or not word[0].isalpha():
+        return word
+    word = word.lower()
+    codes = [_SOUNDEX_CODES.get(c, "") for c in word]
+    key, last = word[0].upper(), codes[0]
+    for c, code in zip(word[1:], codes[1:]):
+        if code and code != "0" and code != last:
+            key += code
+        if c not in "hw":
+            last = code
+    return (key + "000")[:4]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up early once it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def parse_spoken(text: str) -> SpokenName:
+    """Turn a transcribed file name into tokens plus an optional extension."""
+    text = text.strip()
+    for pattern, symbol in SPOKEN_SYMBOLS:
+        text = re.sub(rf"\s*{pattern}\s*", symbol, text, flags=re.IGNORECASE)
+    stem, ext = os.path.splitext(text)
+    if " " in ext:
+        stem, ext = text, ""
+    tokens = [t for t in split_tokens(stem) if t not in FILLER_WORDS]
+    return SpokenName(tokens, ext.lstrip(".").lower() or None)
+
+
+def _token_keys(tokens: List[str]) -> Set[str]:
+    keys = set()
+    for token in tokens:
+        keys.add(f"t:{token}")
+        keys.add(f"p:{token[:3]}")
+        keys.add(f"s:{soundex(token)}")
+    return keys
+
+
+def name_keys(name: str) -> Set[str]:
+    """Blocking keys for a real file name: tokens, 3-letter prefixes and Soundex codes.
+
+    Only names sharing at least one key with the query are scored, so a lookup
+    never has to compute edit distances against the whole index.
+    """
+    return _token_keys(split_tokens(os.path.splitext(name)[0]))
+
+
+def query_keys(spoken: SpokenName) -> Set[str]:
+    return _token_keys(spoken.tokens)
+
+
+def _token_score(query: str, tokens: List[str]) -> float:
+    best = 0.0
+    for token in tokens:
+        if token == query:
+            return 1.0
+        if token.startswith(query) or query.startswith(token):
+            best = max(best, 0.85)
+        elif soundex(token) == soundex(query) and not query.isdigit():
+            best = max(best, 0.75)
+        else:
+            limit = max(len(query), len(token)) // 3
+            dist = edit_distance(query, token, limit)
+            if dist <= limit:
+                best = max(best, 0.9 * (1 - dist / max(len(query), len(token))))
+    return best
+
+
+def score(spoken: SpokenName, name: str) -> float:
+    """0..1 similarity between a spoken name and a real file name."""
+    stem, ext = os.path.splitext(name)
+    tokens = split_tokens(stem)
+    if not spoken.tokens or not tokens:
+        return 0.0
+    matched = sum(_token_score(q, tokens) for q in spoken.tokens) / len(spoken.tokens)
+    # Unmatched extra words in the real name cost a little
+    coverage = min(len(spoken.tokens) / len(tokens), 1.0)
+    result = 0.85 * matched + 0.15 * coverage
+    if spoken.ext:
+        result *= 1.0 if ext.lstrip(".").lower() == spoken.ext else 0.7
+    return result
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Process-wide async HTTP client shared by every network tool.
+# Settings are read lazily so values from .env (loaded in agent.py) are honoured.
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_host_limits: Dict[str, asyncio.Semaphore] = {}
+# Strong references to close tasks for clients left behind by an old event loop
+_retiring: Set[asyncio.Future] = set()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logging.error(f"[ERROR] Invalid value for {name}, using {default}.")
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logging.error(f"[ERROR] Invalid value for {name}, using {default}.")
+        return default
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Create the pooled client from HTTP_* environment settings."""
+    connect_timeout = _env_float("HTTP_CONNECT_TIMEOUT", 3.0)
+    read_timeout = _env_float("HTTP_READ_TIMEOUT", 10.0)
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    limits = httpx.Limits(
+        max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+    )
+    logging.debug(f"[DEBUG] Creating shared HTTP client (http2={HTTP2_AVAILABLE}, timeout={timeout})")
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=limits,
+        http2=HTTP2_AVAILABLE,
+        follow_redirects=True,
+        headers={"User-Agent": "Yogi/1.0"},
+    )
+
+
+async def _close_quietly(client: httpx.AsyncClient) -> None:
+    try:
+        await client.aclose()
+    except Exception as e:
+        logging.debug(f"[DEBUG] Closing stale HTTP client failed: {e}")
+
+
+def _retire(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Close a client built for another event loop, on that loop if it still runs."""
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        future = asyncio.run_coroutine_threadsafe(_close_quietly(client), loop)
+    else:
+        # Its loop is gone: close it from here so its pool is released
+        future = asyncio.ensure_future(_close_quietly(client))
+    _retiring.add(future)
+    future.add_done_callback(_retiring.discard)
+    logging.debug("[DEBUG] Event loop changed, closing the previous HTTP client.")
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it for the running event loop if needed."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        if _client is not None and not _client.is_closed:
+            _retire(_client, _client_loop)
+        _client = _build_client()
+        _client_loop = loop
+        _host_limits.clear()
+    return _client
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    """Per-host connection limiter, so one slow upstream can't hog the pool."""
+    host = urlsplit(url).netloc.lower()
+    sem = _host_limits.get(host)
+    if sem is None:
+        sem = asyncio.Semaphore(_env_int("HTTP_MAX_PER_HOST", 10))
+        _host_limits[host] = sem
+    return sem
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Perform a request on the shared pool without blocking the event loop."""
+    client = get_client()
+    async with _host_semaphore(url):
+        return await client.request(method, url, **kwargs)
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET a URL through the shared pool."""
+    return await request("GET", url, **kwargs)
+
+
+async def aclose() -> None:
+    """Close the shared client (call on worker shutdown)."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logging.debug("[DEBUG] Shared HTTP client closed.")
+    _client = None
+    _client_loop = None
+    _host_limits.clear()
+
+
+def close() -> None:
+    """Close the shared client at process exit, when no event loop is running any more.
+
+    The client is process-wide and outlives individual jobs, so it is closed
+    here (registered with atexit) rather than when one job shuts down.
+    """
+    global _client, _client_loop
+    client, loop = _client, _client_loop
+    _client = None
+    _client_loop = None
+    _host_limits.clear()
+    if client is None or client.is_closed:
+        return
+    try:
+        if loop is not None and not loop.is_closed() and not loop.is_running():
+            loop.run_until_complete(_close_quietly(client))
+        else:
+            asyncio.run(_close_quietly(client))
+    except RuntimeError as e:
+        logging.debug(f"[DEBUG] Could not close the shared HTTP client at exit: {e}")
@@ -0,0 +1,344 @@
+import asyncio
+import logging
+import os
+import queue
+import re
+import secrets
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+# Background mail delivery: send_email enqueues a job and returns immediately,
+# worker threads keep authenticated SMTP sessions warm and deliver from the queue.
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+
+
+# One SMTP transaction: envelope recipients plus the rendered message
+Envelope = Tuple[List[str], str]
+
+
+class MailJob:
+    """One or more queued messages (a batch) and their per-recipient delivery status."""
+
+    def __init__(self, sender: str, envelopes: List[Envelope]):
+        self.id = secrets.token_hex(3)
+        self.sender = sender
+        self.envelopes = envelopes
+        self.recipients = [rcpt for rcpts, _ in envelopes for rcpt in rcpts]
+        self.results: Dict[str, str] = {rcpt: "queued" for rcpt in self.recipients}
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.created = time.time()
+        self.updated = self.created
+
+    def describe(self) -> str:
+        """Speakable one-line status."""
+        to = ", ".join(self.recipients) if len(self.recipients) <= 3 else f"{len(self.recipients)} recipients"
+        if self.status == "failed":
+            return f"Email {self.id} to {to} failed: {self.error}"
+        if self.error:
+            return f"Email {self.id} to {to} is {self.status}. {self.error}"
+        return f"Email {self.id} to {to} is {self.status}."
+
+    def report(self) -> str:
+        """Per-recipient delivery results, one per line."""
+        return "\n".join(f"{rcpt}: {result}" for rcpt, result in self.results.items())
+
+
+class MailSender:
+    """Queue plus worker threads, each holding one persistent SMTP session."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        workers: int = 2,
+        idle_timeout: float = 120.0,
+        check_after: float = 30.0,
+        max_retries: int = 2,
+        starttls: bool = True,
+        history: int = 1000,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.max_retries = max_retries
+        self.starttls = starttls
+        self.history = history
+        self._queue: "queue.Queue[Optional[MailJob]]" = queue.Queue()
+        self._jobs: "OrderedDict[str, MailJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.running = False
+
+    # --- lifecycle ---
+    def start(self) -> "MailSender":
+        if self.running:
+            return self
+        self.running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"mailer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logging.debug(f"[DEBUG] Mail sender started with {self.workers} worker(s) for {self.host}:{self.port}")
+        return self
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """Deliver everything already queued, then stop the workers."""
+        if not self.running:
+            return
+        self.running = False
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        logging.debug("[DEBUG] Mail sender stopped.")
+
+    # --- public API ---
+    def submit(self, sender: str, recipients: List[str], message: str) -> MailJob:
+        """Queue a message for delivery and return its job."""
+        return self.submit_batch(sender, [(recipients, message)])
+
+    def submit_batch(self, sender: str, envelopes: List[Envelope]) -> MailJob:
+        """Queue several messages to go out together over one SMTP session."""
+        job = MailJob(sender, envelopes)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        return job
+
+    def status(self, job_id: str) -> Optional[MailJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest(self) -> Optional[MailJob]:
+        with self._lock:
+            return next(reversed(self._jobs.values()), None)
+
+    def join(self) -> None:
+        """Block until every queued job has been processed."""
+        self._queue.join()
+
+    # --- connection handling ---
+    def connect(self) -> smtplib.SMTP:
+        """Open and authenticate a new SMTP session."""
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.ehlo()
+        if self.starttls and server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        logging.debug(f"[DEBUG] Opened SMTP session to {self.host}:{self.port}")
+        return server
+
+    @staticmethod
+    def _close(server: Optional[smtplib.SMTP]) -> None:
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _is_alive(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def ensure_connection(self, server: Optional[smtplib.SMTP], last_used: float) -> smtplib.SMTP:
+        """Reuse a warm session, probing it with NOOP if it has sat idle for a while."""
+        if server is not None and time.monotonic() - last_used > self.check_after:
+            if not self._is_alive(server):
+                logging.debug("[DEBUG] SMTP session went stale, reconnecting.")
+                self._close(server)
+                server = None
+        return server if server is not None else self.connect()
+
+    @staticmethod
+    def send_envelope(server: smtplib.SMTP, sender: str, recipients: List[str], message: str) -> Dict[str, tuple]:
+        """Send one message, returning refused recipients like `SMTP.sendmail`.
+
+        When the server advertises PIPELINING, MAIL FROM and every RCPT TO go
+        out in a single write and the replies are read back afterwards, saving
+        a round trip per recipient.
+        """
+        server.ehlo_or_helo_if_needed()
+        if not server.has_extn("pipelining"):
+            return server.sendmail(sender, recipients, message)
+        commands = [f"MAIL FROM:{smtplib.quoteaddr(sender)}"]
+        commands += [f"RCPT TO:{smtplib.quoteaddr(rcpt)}" for rcpt in recipients]
+        server.send("".join(f"{cmd}\r\n" for cmd in commands))
+        code, resp = server.getreply()
+        sender_refused = code != 250
+        refused = {}
+        for rcpt in recipients:
+            rcode, rresp = server.getreply()
+            if rcode not in (250, 251):
+                refused[rcpt] = (rcode, rresp)
+        if sender_refused:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, resp, sender)
+        if len(refused) == len(recipients):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, resp = server.data(message)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+
+    # --- worker ---
+    def _set(self, job: MailJob, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            job.status = status
+            job.error = error
+            job.updated = time.time()
+
+    def _worker(self) -> None:
+        server: Optional[smtplib.SMTP] = None
+        last_used = time.monotonic()
+        while True:
+            try:
+                job = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # Let idle sessions go rather than holding them open forever
+                if server is not None:
+                    self._close(server)
+                    server = None
+                    logging.debug("[DEBUG] Closed idle SMTP session.")
+                continue
+            if job is None:
+                self._close(server)
+                self._queue.task_done()
+                return
+            try:
+                server = self._deliver(job, server, last_used)
+                last_used = time.monotonic()
+            finally:
+                self._queue.task_done()
+
+    def _record(self, job: MailJob, recipients: List[str], result: str, refused: Optional[Dict[str, tuple]] = None) -> None:
+        with self._lock:
+            for rcpt in recipients:
+                if refused and rcpt in refused:
+                    code, resp = refused[rcpt]
+                    msg = resp.decode(errors="replace") if isinstance(resp, bytes) else str(resp)
+                    job.results[rcpt] = f"refused ({code} {msg})"
+                else:
+                    job.results[rcpt] = result
+
+    def _finish(self, job: MailJob, error: Optional[str] = None) -> None:
+        bad = [rcpt for rcpt, result in job.results.items() if result != "sent"]
+        if len(bad) < len(job.results):
+            self._set(job, "sent", f"Not delivered to: {', '.join(bad)}" if bad else None)
+        elif error:
+            self._set(job, "failed", error)
+        else:
+            self._set(job, "failed", "All recipients were refused.")
+
+    def _deliver(self, job: MailJob, server: Optional[smtplib.SMTP], last_used: float) -> Optional[smtplib.SMTP]:
+        self._set(job, "sending")
+        pending = list(job.envelopes)
+        for attempt in range(self.max_retries + 1):
+            job.attempts = attempt + 1
+            try:
+                server = self.ensure_connection(server, last_used)
+                # The whole batch shares this one session
+                while pending:
+                    recipients, message = pending[0]
+                    try:
+                        refused = self.send_envelope(server, job.sender, recipients, message)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        refused = e.recipients
+                    except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                        refused = {rcpt: (e.smtp_code, e.smtp_error) for rcpt in recipients}
+                    self._record(job, recipients, "sent", refused)
+                    pending.pop(0)
+                self._finish(job)
+                logging.info(f"[INFO] Email {job.id} processed for {job.recipients}")
+                return server
+            except smtplib.SMTPAuthenticationError as e:
+                logging.error(f"[ERROR] SMTP Auth Error: {e}")
+                self._record(job, [rcpt for rcpts, _ in pending for rcpt in rcpts], "failed")
+                self._finish(job, "Authentication with SMTP failed.")
+                self._close(server)
+                return None
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+                # Dropped or unreachable session: reconnect and retry what is left
+                logging.error(f"[ERROR] SMTP connection problem (attempt {attempt + 1}): {e}")
+                self._close(server)
+                server = None
+                last_used = time.monotonic()
+            except Exception as e:
+                logging.error(f"[ERROR] Failed to send email {job.id}: {e}")
+                self._record(job, [rcpt for rcpts, _ in pending for rcpt in rcpts], "failed")
+                self._finish(job, "Failed to send the email.")
+                return server
+        self._record(job, [rcpt for rcpts, _ in pending for rcpt in rcpts], "failed")
+        self._finish(job, "Could not reach the mail server.")
+        return server
+
+
+# --- templates ---
+TEMPLATE_FIELDS = ("name", "first_name", "email")
+# Only these exact placeholders are filled; any other braces are left as written
+_PLACEHOLDER = re.compile(r"\{(" + "|".join(TEMPLATE_FIELDS) + r")\}")
+
+
+def is_template(*texts: str) -> bool:
+    """True if any text uses a per-recipient placeholder."""
+    return any(_PLACEHOLDER.search(text) for text in texts)
+
+
+def render_template(text: str, recipient: str) -> str:
+    """Fill {name}, {first_name} and {email} for one 'Name <address>' or bare address."""
+    name, address = parseaddr(recipient)
+    name = name or address.split("@")[0]
+    values = {"name": name, "first_name": name.split()[0] if name.split() else name, "email": address}
+    return _PLACEHOLDER.sub(lambda m: values[m.group(1)], text)
+
+
+_sender: Optional[MailSender] = None
+_sender_lock = threading.Lock()
+
+
+def get_mail_sender() -> MailSender:
+    """Return the process-wide mail sender, configured from the environment."""
+    global _sender
+    with _sender_lock:
+        if _sender is None or not _sender.running:
+            _sender = MailSender(
+                host=os.getenv("SMTP_HOST", SMTP_HOST),
+                port=int(os.getenv("SMTP_PORT", SMTP_PORT)),
+                user=os.getenv("gmail_user"),
+                password=os.getenv("gmail_password"),
+                workers=int(os.getenv("SMTP_WORKERS", "2")),
+                idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT", "120")),
+            ).start()
+        return _sender
+
+
+async def ashutdown() -> None:
+    """Drain the queue and stop the sender without blocking the event loop."""
+    global _sender
+    with _sender_lock:
+        sender, _sender = _sender, None
+    if sender is not None:
+        await asyncio.get_running_loop().run_in_executor(None, sender.stop)
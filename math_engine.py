@@ -0,0 +1,201 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+# Pool of warm math worker processes (math_worker.py). Evaluating untrusted
+# expressions in another process means a runaway calculation can be killed
+# outright without touching the agent, and each call gets its own CPU-time and
+# memory limits. The pool grows under load up to `max_workers` and shrinks back
+# to `min_workers` when workers sit idle.
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "math_worker.py")
+
+
+class MathError(Exception):
+    """The expression could not be evaluated."""
+
+
+class MathTimeout(MathError):
+    """The evaluation ran past its time limit and was stopped."""
+
+
+class _Worker:
+    def __init__(self, memory_mb: int):
+        env = dict(os.environ, MATH_MEMORY_MB=str(memory_mb), OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1")
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            env=env,
+        )
+        self.replies: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self.last_used = time.monotonic()
+        threading.Thread(target=self._read, name="math-worker-reader", daemon=True).start()
+
+    def _read(self) -> None:
+        for line in self.proc.stdout:
+            try:
+                self.replies.put(json.loads(line))
+            except ValueError:
+                continue
+        # EOF: the process exited (killed, or over its CPU limit)
+        self.replies.put(None)
+
+    def wait_ready(self, timeout: float) -> bool:
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        return bool(reply and reply.get("ready"))
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+
+class MathPool:
+    """Run expressions in warm worker processes with per-call limits."""
+
+    def __init__(
+        self,
+        min_workers: int = 1,
+        max_workers: int = 4,
+        timeout: float = 5.0,
+        cpu_seconds: Optional[float] = None,
+        memory_mb: int = 1024,
+        idle_timeout: float = 300.0,
+        start_timeout: float = 30.0,
+    ):
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers, 1)
+        self.timeout = timeout
+        self.cpu_seconds = timeout if cpu_seconds is None else cpu_seconds
+        self.memory_mb = memory_mb
+        self.idle_timeout = idle_timeout
+        self.start_timeout = start_timeout
+        self._idle: List[_Worker] = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    # --- workers ---
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self.memory_mb)
+        if not worker.wait_ready(self.start_timeout):
+            worker.kill()
+            raise MathError("the math engine failed to start")
+        return worker
+
+    def _acquire(self) -> _Worker:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise MathError("the math engine is shut down")
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        return worker
+                    self._count -= 1
+                if self._count < self.max_workers:
+                    # Grow: reserve the slot, then start the process outside the lock
+                    self._count += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._spawn()
+        except BaseException:
+            self._discard(None)
+            raise
+
+    def _release(self, worker: _Worker) -> None:
+        worker.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(worker)
+            self._shrink()
+            self._cond.notify()
+
+    def _discard(self, worker: Optional[_Worker]) -> None:
+        if worker is not None:
+            worker.kill()
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _shrink(self) -> None:
+        """Retire workers idle for longer than idle_timeout, keeping min_workers (lock held)."""
+        now = time.monotonic()
+        for worker in list(self._idle):
+            if self._count <= self.min_workers:
+                break
+            if now - worker.last_used > self.idle_timeout:
+                self._idle.remove(worker)
+                self._count -= 1
+                worker.kill()
+
+    def start(self) -> "MathPool":
+        """Warm up min_workers processes in the background."""
+        def warm():
+            for _ in range(self.min_workers):
+                with self._cond:
+                    if self._count >= self.min_workers or self._closed:
+                        return
+                    self._count += 1
+                try:
+                    self._release(self._spawn())
+                except Exception as e:
+                    self._discard(None)
+                    logging.error(f"[ERROR] Could not start math worker: {e}")
+                    return
+        threading.Thread(target=warm, name="math-pool-warm", daemon=True).start()
+        return self
+
+    # --- evaluation ---
+    def run(self, expression: str, timeout: Optional[float] = None) -> str:
+        """Evaluate `expression` in a worker; raises MathTimeout or MathError."""
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._acquire()
+        request_id = next(self._ids)
+        try:
+            worker.proc.stdin.write(json.dumps({"id": request_id, "expression": expression, "cpu_seconds": self.cpu_seconds}) + "\n")
+            worker.proc.stdin.flush()
+            reply = worker.replies.get(timeout=timeout)
+        except queue.Empty:
+            logging.info(f"[INFO] Math evaluation timed out after {timeout}s, restarting worker: {expression[:80]!r}")
+            self._discard(worker)
+            raise MathTimeout(f"the calculation took longer than {timeout:g} seconds")
+        except (OSError, ValueError) as e:
+            self._discard(worker)
+            raise MathError(f"the math engine stopped unexpectedly ({e})")
+        if reply is None:
+            self._discard(worker)
+            raise MathError("the calculation used too much CPU time or memory")
+        self._release(worker)
+        if not reply.get("ok"):
+            raise MathError(reply.get("error", "unknown error"))
+        return reply["result"]
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.kill()
@@ -0,0 +1,341 @@
+import os
+import re
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import sympy
+from sympy.parsing.sympy_parser import (
+    convert_xor,
+    implicit_application,
+    implicit_multiplication,
+    parse_expr,
+    standard_transformations,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The math pipeline run inside math_worker.py: work out what is being asked
+# (solve, simplify, factor, expand, integrate, differentiate or just evaluate),
+# do it symbolically when that fits in the budget, fall back to fast numeric
+# evaluation otherwise, and phrase the answer so it reads well out loud.
+
+# "2x", "x(x+1)" and "sin x" work, but unknown words are not split into letters
+# (implicit_multiplication_application would turn "percent" into p*e*r*c*e*n*t)
+TRANSFORMATIONS = standard_transformations + (implicit_multiplication, implicit_application, convert_xor)
+# Spoken and typed input uses lowercase e and i for the constants
+CONSTANTS = {"e": sympy.E, "i": sympy.I}
+# Names accepted as variables: single letters (optionally numbered) and Greek letters
+VARIABLE_NAME = re.compile(
+    r"^(?:[A-Za-z](?:_?\d+)?|alpha|beta|gamma|delta|epsilon|zeta|eta|theta|iota|kappa|lamda|mu|nu|xi|rho|sigma|tau|phi|chi|psi|omega)$"
+)
+# Seconds allowed for the symbolic step before switching to numeric methods
+SYMBOLIC_BUDGET = float(os.getenv("MATH_SYMBOLIC_BUDGET", "2"))
+MAX_ANSWER_CHARS = 300
+# Trailing "at x = 3, y = 2" clause of an evaluate request
+SUBSTITUTIONS = r"(?:at|when|where|with|for)\s+(\w+\s*=\s*[^,]+(?:\s*(?:,|and)\s*\w+\s*=\s*[^,]+)*)"
+WITH_RESPECT_TO = r"(?:with respect to|wrt|d/d)\s*([A-Za-z]\w*)"
+
+INTENTS = [
+    ("solve", r"(?:solve|find the roots? of|roots? of)"),
+    ("simplify", r"simplify"),
+    ("factor", r"factori[sz]e|factor"),
+    ("expand", r"expand"),
+    ("integrate", r"(?:the )?integral of|integrate"),
+    ("differentiate", r"(?:the )?derivative of|differentiate"),
+    ("evaluate", r"evaluate|calculate|compute|what is|what's"),
+]
+
+
+class SymbolicTimeout(Exception):
+    """The symbolic step ran past its budget."""
+
+
+@contextmanager
+def time_budget(seconds: float):
+    """Raise SymbolicTimeout in the block after `seconds` (POSIX main thread only)."""
+    usable = hasattr(signal, "setitimer") and seconds > 0 and threading.current_thread() is threading.main_thread()
+    if not usable:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise SymbolicTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# --- parsing ---
+def parse(text: str) -> sympy.Expr:
+    text = text.replace("×", "*").replace("÷", "/").replace("−", "-")
+    expr = parse_expr(text, local_dict=dict(CONSTANTS), transformations=TRANSFORMATIONS)
+    if not isinstance(expr, sympy.Basic) or isinstance(expr, sympy.FunctionClass):
+        # A bare function name ("limit", "sin") with nothing to apply it to
+        raise ValueError(f"I don't know what '{text.strip()}' means here")
+    unknown = sorted(s.name for s in getattr(expr, "free_symbols", ()) if not VARIABLE_NAME.match(s.name))
+    if unknown:
+        raise ValueError(f"I don't know what '{unknown[0]}' means here")
+    return expr
+
+
+def parse_relation(text: str):
+    """An Eq for "lhs = rhs", otherwise a plain expression."""
+    text = text.replace("==", "=")
+    if "=" in text:
+        lhs, rhs = text.split("=", 1)
+        return sympy.Eq(parse(lhs), parse(rhs))
+    return parse(text)
+
+
+def detect_intent(text: str) -> Tuple[str, str]:
+    """(intent, rest of the text); the intent is "" when none is stated."""
+    for intent, pattern in INTENTS:
+        match = re.match(rf"(?:{pattern})\b[:\s]*", text, re.IGNORECASE)
+        if match:
+            return intent, text[match.end():]
+    return "", text
+
+
+def _take(pattern: str, text: str) -> Tuple[Optional[re.Match], str]:
+    """Cut a trailing clause matching `pattern` off `text`."""
+    match = re.search(rf"\s+{pattern}\s*$", text, re.IGNORECASE)
+    if match is None:
+        return None, text
+    return match, text[:match.start()]
+
+
+def _take_leading(pattern: str, text: str) -> Tuple[Optional[re.Match], str]:
+    """Cut a leading clause matching `pattern` (ended by ":", "," or a space) off `text`."""
+    match = re.match(rf"{pattern}(?:\s*[:,]\s*|\s+)", text, re.IGNORECASE)
+    if match is None:
+        return None, text
+    return match, text[match.end():]
+
+
+def substitutions(clause: Optional[re.Match]) -> Dict[sympy.Symbol, sympy.Expr]:
+    """Values from a SUBSTITUTIONS clause ("at x = 3, y = 2")."""
+    if clause is None:
+        return {}
+    values = {}
+    for name, value in re.findall(r"(\w+)\s*=\s*([^,]+?)(?=\s*(?:,|\band\b|$))", clause.group(1)):
+        values[sympy.Symbol(name)] = parse(value)
+    return values
+
+
+def split_system(text: str) -> List[str]:
+    parts = [p for p in re.split(r"\s*(?:;|,|\band\b)\s*", text) if p.strip()]
+    return parts if len(parts) > 1 and all("=" in p for p in parts) else [text]
+
+
+# --- answers ---
+def _format_float(value: float) -> str:
+    text = f"{value:.6g}"
+    if text in ("inf", "-inf", "nan"):
+        return words(text.replace("inf", "oo"))
+    return _exponent_words(text)
+
+
+def _exponent_words(text: str) -> str:
+    return text.replace("e+", " times 10 to the ").replace("e-", " times 10 to the minus ") if "e" in text else text
+
+
+def approximate(value) -> str:
+    """Six significant digits, spoken; works for integers far beyond float range."""
+    approx = sympy.N(value, 6)
+    if approx.is_real:
+        mantissa, _, exponent = sympy.sstr(approx).partition("e")
+        mantissa = mantissa.rstrip("0").rstrip(".") if "." in mantissa else mantissa
+        return _exponent_words(f"{mantissa}e{exponent}" if exponent else mantissa)
+    return words(sympy.sstr(approx))
+
+
+def words(text: str) -> str:
+    """Make sympy's printed form easier to read aloud."""
+    text = re.sub(r"\*\*2\b", " squared", text)
+    text = re.sub(r"\*\*3\b", " cubed", text)
+    text = text.replace("**", "^").replace("*", " times ")
+    text = re.sub(r"\bsqrt\((\w+)\)", r"square root of \1", text)
+    text = re.sub(r"\bsqrt\(", "square root of (", text)
+    text = re.sub(r"\boo\b", "infinity", text)
+    # Complex infinity (1/0) and not-a-number (0/0) have no value to read out
+    text = re.sub(r"-?\b(?:zoo|nan)\b", "undefined", text)
+    text = re.sub(r"\bI\b", "i", text)
+    return " ".join(text.split())
+
+
+def speak(value) -> str:
+    if isinstance(value, sympy.Basic) and value.is_number:
+        exact = sympy.sstr(value)
+        if value.is_Integer and len(exact) <= 15:
+            return exact
+        if isinstance(value, sympy.Float) or len(exact) > 40 or value.has(sympy.RootOf):
+            return f"about {approximate(value)}" if not isinstance(value, sympy.Float) else approximate(value)
+        if not value.is_real:
+            return words(exact)
+        return f"{words(exact)}, which is about {approximate(value)}"
+    return words(sympy.sstr(value))
+
+
+def _clip(answer: str) -> str:
+    if len(answer) <= MAX_ANSWER_CHARS:
+        return answer
+    return f"The answer is too long to read out in full. It starts: {answer[:MAX_ANSWER_CHARS]}..."
+
+
+def _pick_symbol(expr, name: Optional[str]) -> sympy.Symbol:
+    if name:
+        return sympy.Symbol(name)
+    free = sorted(expr.free_symbols, key=lambda s: s.name)
+    return free[0] if free else sympy.Symbol("x")
+
+
+# --- operations ---
+def numeric_value(expr, substitutions: Dict[sympy.Symbol, float]) -> float:
+    """Fast float evaluation through lambdify (NumPy when installed)."""
+    symbols = sorted(substitutions, key=lambda s: s.name)
+    fn = sympy.lambdify(symbols, expr, "numpy" if numpy is not None else "math")
+    return fn(*[substitutions[s] for s in symbols])
+
+
+def solve(text: str, variable: Optional[str]) -> str:
+    equations = [parse_relation(part) for part in split_system(text)]
+    equations = [eq if isinstance(eq, sympy.Eq) or eq in (sympy.true, sympy.false) else sympy.Eq(eq, 0) for eq in equations]
+    if all(eq == sympy.true for eq in equations):
+        return "That is true for every value."
+    if any(eq == sympy.false for eq in equations):
+        return "There is no solution."
+    free = sorted(set().union(*(eq.free_symbols for eq in equations)), key=lambda s: s.name)
+    symbols = [sympy.Symbol(variable)] if variable else free
+    try:
+        with time_budget(SYMBOLIC_BUDGET):
+            if len(equations) == 1 and len(symbols) == 1:
+                solutions = sympy.solve(equations[0], symbols[0], dict=True)
+            else:
+                solutions = sympy.solve(equations, symbols, dict=True)
+    except (SymbolicTimeout, NotImplementedError):
+        return numeric_solve(equations, symbols)
+    if not solutions:
+        return "There is no solution."
+    answers = [", ".join(f"{s} = {speak(v)}" for s, v in sorted(sol.items(), key=lambda item: item[0].name)) for sol in solutions]
+    return " or ".join(answers)
+
+
+def numeric_solve(equations, symbols) -> str:
+    """Approximate roots when there is no (fast enough) symbolic answer."""
+    if len(equations) != 1 or len(symbols) != 1:
+        return "I couldn't solve that system exactly or numerically."
+    expr = equations[0].lhs - equations[0].rhs
+    symbol = symbols[0]
+    if expr.is_polynomial(symbol):
+        roots = sympy.Poly(expr, symbol).nroots(n=8)
+    else:
+        roots = []
+        for start in (0, 1, -1, 10, -10):
+            try:
+                root = sympy.nsolve(expr, symbol, start)
+            except (ValueError, ZeroDivisionError, TypeError):
+                continue
+            if all(abs(root - r) > 1e-6 for r in roots):
+                roots.append(root)
+    if not roots:
+        return "I couldn't find a solution."
+    return "approximately " + " or ".join(f"{symbol} = {approximate(r)}" for r in roots)
+
+
+def integrate(text: str, variable: Optional[str]) -> str:
+    # The differential may come before or after the bounds: "x^2 dx from 0 to 1", "x^2 from 0 to 1 dx"
+    differential, text = _take(r"d([A-Za-z])", text)
+    bounds, text = _take(r"from\s+(.+?)\s+to\s+(.+)", text)
+    if differential is None:
+        differential, text = _take(r"d([A-Za-z])", text)
+    variable = variable or (differential.group(1) if differential else None)
+    expr = parse(text)
+    symbol = _pick_symbol(expr, variable)
+    if bounds:
+        lower, upper = parse(bounds.group(1)), parse(bounds.group(2))
+        try:
+            with time_budget(SYMBOLIC_BUDGET):
+                result = sympy.integrate(expr, (symbol, lower, upper))
+            if isinstance(result, sympy.Integral):
+                raise NotImplementedError
+        except (SymbolicTimeout, NotImplementedError):
+            result = sympy.Integral(expr, (symbol, lower, upper)).evalf(8)
+        return speak(result)
+    try:
+        with time_budget(SYMBOLIC_BUDGET):
+            result = sympy.integrate(expr, symbol)
+    except SymbolicTimeout:
+        return "I couldn't find that integral in time."
+    if isinstance(result, sympy.Integral):
+        return "I couldn't find that integral in closed form."
+    return f"{speak(result)} plus a constant"
+
+
+def transform(intent: str, text: str, variable: Optional[str], values: Dict[sympy.Symbol, sympy.Expr]) -> str:
+    """Simplify, factor, expand or differentiate; with `values`, evaluate the result there."""
+    expr = parse(text)
+    operation = {
+        "simplify": sympy.simplify,
+        "factor": sympy.factor,
+        "expand": sympy.expand,
+        "differentiate": lambda e: sympy.diff(e, _pick_symbol(e, variable)),
+    }[intent]
+    try:
+        with time_budget(SYMBOLIC_BUDGET):
+            result = operation(expr)
+            return speak(sympy.simplify(result.subs(values)) if values else result)
+    except SymbolicTimeout:
+        return f"I couldn't {intent} that in time. As written it is {speak(expr)}."
+
+
+def evaluate(text: str, values: Dict[sympy.Symbol, sympy.Expr]) -> str:
+    expr = parse(text)
+    if values:
+        if expr.free_symbols <= set(values):
+            try:
+                return _format_float(float(numeric_value(expr, {s: float(v) for s, v in values.items()})))
+            except (ArithmeticError, ValueError, TypeError):
+                pass  # 1/0, log(0), sqrt(-1): let sympy work out the exact value below
+        expr = expr.subs(values)
+    if expr.free_symbols:
+        try:
+            with time_budget(SYMBOLIC_BUDGET):
+                return speak(sympy.simplify(expr))
+        except SymbolicTimeout:
+            return speak(expr)
+    return speak(expr)
+
+
+def solve_text(text: str) -> str:
+    """Answer a typed or transcribed math request in speakable form."""
+    text = " ".join(text.strip().rstrip("?.!").split())
+    intent, body = detect_intent(text)
+    at, rest = _take(SUBSTITUTIONS, body)
+    if intent == "solve" or (not intent and "=" in rest.replace("==", "=")):
+        wrt, body = _take(WITH_RESPECT_TO, body)
+        # "solve for x: 2x + 1 = 5" or "solve 2x + 1 = 5 for x"
+        target, body = _take_leading(r"for\s+([A-Za-z]\w*)", body)
+        if target is None:
+            target, body = _take(r"for\s+([A-Za-z]\w*)", body)
+        variable = wrt or target
+        return _clip(solve(body, variable.group(1) if variable else None))
+    wrt, body = _take(WITH_RESPECT_TO, rest)
+    variable = wrt.group(1) if wrt else None
+    values = substitutions(at)
+    if intent == "integrate":
+        if at:
+            return "I can't evaluate an integral at a point; give limits like 'from 0 to 1' instead."
+        return _clip(integrate(body, variable))
+    if intent in ("simplify", "factor", "expand", "differentiate"):
+        return _clip(transform(intent, body, variable, values))
+    return _clip(evaluate(body, values))
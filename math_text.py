@@ -0,0 +1,89 @@
+import re
+from typing import List, Optional
+
+# Canonical form for math requests as they arrive from speech or typing.
+# "What is two times three?", "2 x 3" and "2*3" all become "2*3", so the
+# solver sees fewer spellings and repeated questions share one cache entry.
+# The result is what the solver evaluates, so it only rewrites spoken words
+# and spacing around operators; case and everything else are left alone.
+
+UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90}
+SCALES = {"hundred": 100, "thousand": 1000, "million": 1000000}
+_NUMBER_WORD = "|".join(sorted(list(UNITS) + list(TENS) + list(SCALES), key=len, reverse=True))
+# A run of number words: "twenty one", "three hundred and five", "forty-two"
+NUMBER_RUN = re.compile(rf"\b(?:{_NUMBER_WORD})(?:(?:[\s-]+|\s+and\s+)(?:{_NUMBER_WORD}))*\b", re.IGNORECASE)
+
+# Order matters: longer phrases before their prefixes
+SPOKEN_OPERATORS = [
+    (r"\bmultiplied by\b", "*"),
+    (r"\bdivided by\b", "/"),
+    (r"\bto the power of\b", "^"),
+    (r"\braised to(?: the)?\b", "^"),
+    (r"\bis equal to\b", "="),
+    (r"\bequals?\b", "="),
+    (r"\bplus\b", "+"),
+    (r"\bminus\b", "-"),
+    (r"\btimes\b", "*"),
+    (r"\bover\b", "/"),
+    (r"\bsquared\b", "^2"),
+    (r"\bcubed\b", "^3"),
+]
+FILLER_PREFIX = re.compile(r"^(?:(?:what is|what's|how much is|calculate|compute|evaluate|tell me)\s+)+", re.IGNORECASE)
+# Spaces around these are dropped; brackets and commas keep theirs ("sin(x) dx" must stay two words)
+OPERATOR_CHARS = r"+\-*/^="
+
+
+def _number_groups(words: List[str]) -> List[int]:
+    """Values of a run of number words; digit-by-digit speech ("one two") gives several numbers."""
+    groups: List[int] = []
+    total, current, last = 0, 0, None
+    for word in words:
+        if word == "and":
+            continue
+        if word in SCALES:
+            scale = SCALES[word]
+            if scale == 100:
+                current = (current or 1) * 100
+            else:
+                total += (current or 1) * scale
+                current = 0
+            last = "scale"
+            continue
+        value = UNITS.get(word, TENS.get(word))
+        # A unit after a unit or teen, or a tens word after anything but a scale, starts a new number
+        fits = last in (None, "scale") or (last == "tens" and value < 10)
+        if not fits:
+            groups.append(total + current)
+            total, current = 0, 0
+        current += value
+        last = "tens" if word in TENS else "unit"
+    groups.append(total + current)
+    return groups
+
+
+def _spoken_number(match: re.Match) -> str:
+    words = [w.lower() for w in re.split(r"[\s-]+", match.group(0)) if w]
+    return " ".join(str(n) for n in _number_groups(words))
+
+
+def normalize_expression(text: Optional[str]) -> str:
+    """Canonical spelling of a math request (also used as its cache key)."""
+    text = (text or "").strip().rstrip("?!. ")
+    text = text.replace("×", "*").replace("·", "*").replace("÷", "/").replace("−", "-").replace("**", "^")
+    text = FILLER_PREFIX.sub("", text)
+    text = NUMBER_RUN.sub(_spoken_number, text)
+    for pattern, symbol in SPOKEN_OPERATORS:
+        text = re.sub(pattern, f" {symbol} ", text, flags=re.IGNORECASE)
+    # "three point five" -> "3.5"
+    text = re.sub(r"(?<=\d)\s+point\s+(?=\d)", ".", text, flags=re.IGNORECASE)
+    # "square root of 9" -> "sqrt(9)" (one number or name; longer operands need brackets)
+    text = re.sub(r"\b(?:the )?square root of\s+([\w.]+)", r"sqrt(\1)", text, flags=re.IGNORECASE)
+    # "x" written for multiplication between numbers: "3 x 4", "3x4"
+    text = re.sub(r"(?<=\d)\s*x\s*(?=\d)", "*", text)
+    text = " ".join(text.split())
+    return re.sub(rf"\s*([{OPERATOR_CHARS}])\s*", r"\1", text)
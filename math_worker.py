@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+# Child process that evaluates math for MathPool (math_engine.py). It reads one
+# JSON request per line on stdin and writes one JSON reply per line on stdout.
+# Each request runs under a CPU-time limit and the whole process under a memory
+# limit, where the OS supports them; MathPool kills the process on timeout.
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock timeout applies
+    resource = None
+
+
+def limit_memory(megabytes: int) -> None:
+    if resource is not None and megabytes > 0:
+        limit = megabytes * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def limit_cpu(seconds: float) -> None:
+    """Allow `seconds` more CPU time from now; past that the OS kills the process."""
+    if resource is None or seconds <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def evaluate(expression: str) -> str:
+    from math_solver import solve_text
+    return solve_text(expression)
+
+
+def main() -> None:
+    out = sys.stdout
+    # Keep stray prints from libraries off the reply channel
+    sys.stdout = sys.stderr
+    limit_memory(int(os.getenv("MATH_MEMORY_MB", "1024")))
+    import math_solver  # noqa: F401  (warm up: importing sympy is most of a cold start)
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        request = json.loads(line)
+        limit_cpu(request.get("cpu_seconds", 0))
+        try:
+            reply = {"id": request["id"], "ok": True, "result": evaluate(request["expression"])}
+        except MemoryError:
+            reply = {"id": request["id"], "ok": False, "error": "the calculation needed too much memory"}
+        except Exception as e:
+            reply = {"id": request["id"], "ok": False, "error": str(e) or type(e).__name__}
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+# Self-metrics for the agent: per-tool call counts, errors and latency
+# histograms, an event-loop lag probe, and registered TTLCache counters, all
+# served in Prometheus text format from a small local HTTP endpoint.
+# Histograms (not client-side quantiles) so several agent processes can be
+# aggregated: quantiles come from histogram_quantile() over the summed buckets.
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Tool whose call is running in the current task, for record_error()
+_current_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tool", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one observed value."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.total:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.active: Dict[str, int] = {}
+        # Tools that ran since the loop probe last woke up
+        self.touched: Set[str] = set()
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.loop_stalls = 0
+        self.caches: List = []
+
+    def start_call(self, tool: str) -> None:
+        with self._lock:
+            self.active[tool] = self.active.get(tool, 0) + 1
+            self.touched.add(tool)
+
+    def end_call(self, tool: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.active[tool] -= 1
+            self.latency.setdefault(tool, Histogram()).observe(seconds)
+            if failed:
+                self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def record_error(self, tool: Optional[str] = None) -> None:
+        """Count a failure a tool handled itself (it caught the error and returned a message).
+
+        `tool` defaults to the instrumented tool running in the current task.
+        """
+        tool = tool or _current_tool.get()
+        if tool is None:
+            return
+        with self._lock:
+            self.errors[tool] = self.errors.get(tool, 0) + 1
+
+    def take_touched(self) -> List[str]:
+        """Tools that ran since the last call, including ones still running."""
+        with self._lock:
+            touched = self.touched | {tool for tool, n in self.active.items() if n > 0}
+            self.touched = set()
+            return sorted(touched)
+
+    def observe_lag(self, seconds: float, stalled: bool) -> None:
+        with self._lock:
+            self.loop_lag.observe(seconds)
+            if stalled:
+                self.loop_stalls += 1
+
+    def register_cache(self, cache) -> None:
+        """Export a TTLCache's stats() counters."""
+        self.caches.append(cache)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        out = [
+            "# HELP yogi_tool_calls_total Tool calls.",
+            "# TYPE yogi_tool_calls_total counter",
+        ]
+        with self._lock:
+            tools = sorted(self.latency)
+            out += [f'yogi_tool_calls_total{{tool="{t}"}} {self.latency[t].count}' for t in tools]
+            out += [
+                "# HELP yogi_tool_errors_total Tool calls that raised or reported a failure.",
+                "# TYPE yogi_tool_errors_total counter",
+            ]
+            out += [f'yogi_tool_errors_total{{tool="{t}"}} {self.errors.get(t, 0)}' for t in sorted(set(tools) | set(self.errors))]
+            out += ["# HELP yogi_tool_latency_seconds Tool call latency.", "# TYPE yogi_tool_latency_seconds histogram"]
+            for t in tools:
+                out += self.latency[t].render("yogi_tool_latency_seconds", f'tool="{t}"')
+            out += ["# HELP yogi_tool_in_flight Tool calls currently running.", "# TYPE yogi_tool_in_flight gauge"]
+            out += [f'yogi_tool_in_flight{{tool="{t}"}} {n}' for t, n in sorted(self.active.items())]
+            out += ["# HELP yogi_event_loop_lag_seconds Extra delay of the event loop probe.", "# TYPE yogi_event_loop_lag_seconds histogram"]
+            out += self.loop_lag.render("yogi_event_loop_lag_seconds")
+            out += ["# HELP yogi_event_loop_stalls_total Probes that found the loop blocked.", "# TYPE yogi_event_loop_stalls_total counter"]
+            out.append(f"yogi_event_loop_stalls_total {self.loop_stalls}")
+            caches = list(self.caches)
+        stats = [cache.stats() for cache in caches]
+        for field, kind in (("hits", "counter"), ("misses", "counter"), ("coalesced", "counter"), ("evictions", "counter"), ("size", "gauge")):
+            name = f"yogi_cache_{field}_total" if kind == "counter" else f"yogi_cache_{field}"
+            out += [f"# TYPE {name} {kind}"] + [f'{name}{{cache="{s["name"]}"}} {s[field]}' for s in stats]
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+def instrument(fn: Callable) -> Callable:
+    """Wrap an async tool so every call is counted and timed."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = _current_tool.set(name)
+        registry.start_call(name)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            registry.end_call(name, time.perf_counter() - started, failed)
+            _current_tool.reset(token)
+
+    return wrapper
+
+
+async def watch_event_loop(interval: float = 0.5, threshold: float = 0.1) -> None:
+    """Sleep `interval` repeatedly and record how late each wake-up is.
+
+    A late wake-up means something held the loop; the tools that ran since
+    the previous wake-up are logged as the likely culprits.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        stalled = lag > threshold
+        registry.observe_lag(lag, stalled)
+        suspects = registry.take_touched()
+        if stalled:
+            logging.info(f"[INFO] Event loop blocked for {lag * 1000:.0f}ms (tools that ran meanwhile: {', '.join(suspects) or 'none'})")
+
+
+_watch_task: Optional[asyncio.Task] = None
+
+
+def start_loop_watch(interval: float = 0.5, threshold: float = 0.1) -> asyncio.Task:
+    """Run watch_event_loop on the current loop (idempotent)."""
+    global _watch_task
+    if _watch_task is None or _watch_task.done():
+        _watch_task = asyncio.create_task(watch_event_loop(interval, threshold))
+    return _watch_task
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"[DEBUG] metrics: {format % args}")
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def serve(port: int, host: str = "127.0.0.1") -> bool:
+    """Serve /metrics on a background thread (once per process); False if the port is taken."""
+    global _server
+    if _server is not None:
+        return True
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error(f"[ERROR] Could not serve metrics on {host}:{port}: {e}")
+        return False
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"[INFO] Serving metrics on http://{host}:{port}/metrics")
+    return True
@@ -0,0 +1,103 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Hashable, List, Tuple
+
+# In-memory inverted index over notes, ranked with BM25. Only the posting lists
+# of the query terms are touched, so query time depends on how common the terms
+# are rather than on how many notes exist.
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or "
+    "so that the this to was were will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def make_snippet(text: str, terms: List[str], width: int = 80) -> str:
+    """Short excerpt around the first matching term."""
+    lowered = text.lower()
+    positions = []
+    for term in terms:
+        match = re.search(rf"\b{re.escape(term)}\b", lowered)
+        if match:
+            positions.append(match.start())
+    start = max(min(positions) - width // 2, 0) if positions else 0
+    end = min(start + width, len(text))
+    snippet = " ".join(text[start:end].split())
+    return f"{'...' if start > 0 else ''}{snippet}{'...' if end < len(text) else ''}"
+
+
+class NotesIndex:
+    """Inverted index with incremental updates and BM25 ranking."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_terms: Dict[Hashable, Counter] = {}
+        self.doc_len: Dict[Hashable, int] = {}
+        self.total_len = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def remove(self, doc_id: Hashable) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+
+    def append(self, doc_id: Hashable, text: str) -> None:
+        """Add more text to a document; cost depends only on the new text."""
+        terms = Counter(tokenize(text))
+        doc_terms = self.doc_terms.setdefault(doc_id, Counter())
+        doc_terms.update(terms)
+        for term, tf in terms.items():
+            docs = self.postings.setdefault(term, {})
+            docs[doc_id] = docs.get(doc_id, 0) + tf
+        added = sum(terms.values())
+        self.doc_len[doc_id] = self.doc_len.get(doc_id, 0) + added
+        self.total_len += added
+
+    def update(self, doc_id: Hashable, text: str) -> None:
+        """Index (or re-index) one document."""
+        self.remove(doc_id)
+        self.append(doc_id, text)
+
+    def rebuild(self, docs: Dict[Hashable, str]) -> None:
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_len.clear()
+        self.total_len = 0
+        for doc_id, text in docs.items():
+            self.update(doc_id, text)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Hashable, float]]:
+        """Return up to `limit` (doc_id, score) pairs, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_len:
+            return []
+        n_docs = len(self.doc_len)
+        avg_len = self.total_len / n_docs or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
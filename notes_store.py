@@ -0,0 +1,162 @@
+import datetime
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from notes_index import NotesIndex, make_snippet, tokenize
+from storage import FileLock, read_json
+
+
+class NotesStore:
+    """Notes kept as an append-only journal of timestamped fragments.
+
+    Each line of the journal is one fragment, `{"note_id", "ts", "text"}`;
+    a logical note is all fragments sharing a note id, joined only when it is
+    read. Appending is a single locked write at the end of the file, however
+    many notes exist. Other processes' appends are picked up by reading just
+    the new tail of the journal. Every method takes `self.lock`, so the store
+    can be used from worker threads.
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock = FileLock(path)
+        self.index = NotesIndex()
+        self._fragments: Dict[int, List[dict]] = {}
+        self._joined: Dict[int, str] = {}
+        self._offset = 0
+        self._inode = None
+        self._last_id = 0
+
+    # --- loading ---
+    def _migrate_legacy(self) -> None:
+        """Convert a notes.json list into one fragment per note (lock held)."""
+        if not self.legacy_path or os.path.exists(self.path) or not os.path.exists(self.legacy_path):
+            return
+        notes = read_json(self.legacy_path)
+        ts = datetime.datetime.now().isoformat(timespec="seconds")
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for note_id, text in enumerate(notes, start=1):
+                f.write(json.dumps({"note_id": note_id, "ts": ts, "text": text}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+        logging.info(f"[INFO] Migrated {len(notes)} note(s) from {self.legacy_path} to {self.path}")
+
+    def _reset(self) -> None:
+        self._fragments.clear()
+        self._joined.clear()
+        self.index.rebuild({})
+        self._offset = 0
+        self._last_id = 0
+
+    def _add_fragment(self, fragment: dict) -> None:
+        note_id = fragment["note_id"]
+        self._fragments.setdefault(note_id, []).append(fragment)
+        self._joined.pop(note_id, None)
+        self.index.append(note_id, fragment["text"])
+        self._last_id = max(self._last_id, note_id)
+
+    def refresh(self) -> None:
+        """Catch up with the journal on disk, reading only what is new."""
+        with self.lock:
+            self._migrate_legacy()
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._offset:
+                    self._reset()
+                return
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._reset()
+                self._inode = st.st_ino
+            if st.st_size == self._offset:
+                return
+            torn = False
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                for raw in f:
+                    try:
+                        if not raw.endswith(b"\n"):
+                            raise ValueError("incomplete record")
+                        fragment = json.loads(raw)
+                    except ValueError as e:
+                        logging.error(f"[ERROR] Ignoring damaged note fragment in {self.path}: {e}")
+                        torn = True
+                        break
+                    self._offset += len(raw)
+                    self._add_fragment(fragment)
+            if torn:
+                # A torn final line from a crash mid-append: cut it off (we hold the lock)
+                with open(self.path, "r+b") as f:
+                    f.truncate(self._offset)
+
+    # --- public API ---
+    def append(self, text: str, note_id: Optional[int] = None, new_note: bool = False) -> Tuple[int, bool]:
+        """Add a fragment to `note_id` (default: the latest note) or start a new note.
+
+        Returns (note_id, created). Raises ValueError if both `note_id` and
+        `new_note` are given, KeyError if `note_id` does not exist.
+        """
+        if new_note and note_id is not None:
+            raise ValueError("note_id and new_note are mutually exclusive")
+        with self.lock:
+            self.refresh()
+            if new_note or not self._last_id:
+                note_id = self._last_id + 1
+            elif note_id is None:
+                note_id = self._last_id
+            elif note_id not in self._fragments:
+                raise KeyError(note_id)
+            created = note_id not in self._fragments
+            fragment = {"note_id": note_id, "ts": datetime.datetime.now().isoformat(timespec="seconds"), "text": text}
+            line = (json.dumps(fragment, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(self.path, "ab") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._inode is None:
+                self._inode = os.stat(self.path).st_ino
+            self._offset += len(line)
+            self._add_fragment(fragment)
+            return note_id, created
+
+    def text(self, note_id: int) -> str:
+        """Reassemble a note from its fragments (cached until it changes)."""
+        with self.lock:
+            joined = self._joined.get(note_id)
+            if joined is None:
+                parts = [f["text"] for f in self._fragments.get(note_id, [])]
+                # Same joining rule write_note has always used: trim only at the seams
+                last = len(parts) - 1
+                trimmed = []
+                for i, part in enumerate(parts):
+                    if i > 0:
+                        part = part.lstrip()
+                    if i < last:
+                        part = part.rstrip()
+                    trimmed.append(part)
+                joined = "\n".join(trimmed)
+                self._joined[note_id] = joined
+            return joined
+
+    def note_ids(self) -> List[int]:
+        with self.lock:
+            self.refresh()
+            return sorted(self._fragments)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self._fragments)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[int, float, str]]:
+        """Best matching notes as (note_id, score, snippet)."""
+        terms = tokenize(query)
+        # Held throughout so another thread's refresh or append can't reshape the index mid-read
+        with self.lock:
+            self.refresh()
+            return [(note_id, score, make_snippet(self.text(note_id), terms)) for note_id, score in self.index.search(query, limit)]
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+# Safe shared access to the JSON data files when several agent workers run
+# from the same directory: a cross-process lock file, atomic replace-on-write,
+# and optimistic version checks so stale in-memory copies are noticed and
+# never written back over someone else's changes.
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class LockTimeout(Exception):
+    """Another process held the lock for too long."""
+
+
+class VersionConflict(Exception):
+    """The file changed on disk since it was read."""
+
+
+class FileLock:
+    """Re-entrant cross-process lock held on `<path>.lock`."""
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.lock_path = f"{path}.lock"
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise LockTimeout(self.lock_path)
+        if self._depth == 0:
+            try:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                deadline = time.monotonic() + self.timeout
+                while not _try_lock(fd):
+                    if time.monotonic() > deadline:
+                        os.close(fd)
+                        raise LockTimeout(self.lock_path)
+                    time.sleep(0.01)
+                self._fd = fd
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            try:
+                _unlock(self._fd)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    """Cheap version stamp for a file: (inode, size, mtime_ns), or None if missing.
+
+    Atomic replacement gives the file a new inode, so any rewrite changes it.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def check_version(path: str, expected_version: Optional[Tuple[int, int, int]]) -> None:
+    """Raise VersionConflict if `path` is no longer at `expected_version`.
+
+    Call it with the file's lock held. It also catches writers that do not take
+    the lock at all, such as an older agent build sharing the directory.
+    """
+    current = file_version(path)
+    if current != expected_version:
+        raise VersionConflict(f"{path} changed on disk (expected {expected_version}, found {current})")
+
+
+def atomic_write_json(path: str, data, expected_version: Optional[Tuple[int, int, int]] = None, check: bool = False) -> None:
+    """Write JSON to a temp file, fsync it, then rename it over `path`.
+
+    With `check=True` the write is refused with VersionConflict unless the file
+    is still at `expected_version` (None meaning it must not exist yet).
+    """
+    if check:
+        check_version(path, expected_version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_json(path: str, default: Callable[[], Any] = list) -> Any:
+    """Load a JSON file, or `default()` if it is missing or damaged.
+
+    A damaged file is moved aside for inspection rather than wiped.
+    """
+    name = os.path.basename(path)
+    if not os.path.exists(path):
+        logging.debug(f"[DEBUG] No {name} found at {path}, starting fresh.")
+        return default()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        logging.debug(f"[DEBUG] Loaded {name}")
+        return data
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        backup = f"{path}.corrupt-{int(time.time())}"
+        os.replace(path, backup)
+        logging.error(f"[ERROR] Could not parse {path}: {e}, moved it to {backup}.")
+        return default()
@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+import psutil
+
+# Background sampling of machine and process stats. psutil's CPU percentage is
+# measured between two calls, so sampling on a timer lets get_system_info read
+# the latest numbers instantly instead of blocking for a measuring interval.
+
+
+class Sample(NamedTuple):
+    ts: float
+    cpu: float
+    ram_percent: float
+    ram_used: int
+    ram_total: int
+    disk_percent: float
+    disk_used: int
+    disk_total: int
+    net_sent_rate: float  # bytes per second since the previous sample
+    net_recv_rate: float
+    proc_cpu: float  # this agent process
+    proc_rss: int
+    top: List[Tuple[str, float]]  # busiest processes as (name, cpu percent)
+
+
+class Trend(NamedTuple):
+    minutes: float
+    samples: int
+    cpu_avg: float
+    cpu_max: float
+    ram_avg: float
+    ram_max: float
+    net_sent_avg: float
+    net_recv_avg: float
+
+
+class SystemMonitor:
+    """Samples system stats every `interval` seconds into a ring buffer.
+
+    The buffer holds `history` seconds of samples; `latest` and `trend`
+    only read it, so they never wait on psutil.
+    """
+
+    def __init__(self, interval: float = 5.0, history: float = 3600.0, disk_path: str = "/", top_n: int = 3):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.top_n = top_n
+        self.samples: Deque[Sample] = deque(maxlen=max(int(history / interval), 1))
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process = psutil.Process()
+        self._last_net = None
+        self._last_ts = 0.0
+
+    def _prime(self) -> None:
+        # The first cpu_percent(None) call only sets the baseline
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        for proc in psutil.process_iter(["name"]):
+            try:
+                proc.cpu_percent(interval=None)
+            except psutil.Error:
+                continue
+        self._last_net = psutil.net_io_counters()
+        self._last_ts = time.monotonic()
+
+    def _top_processes(self) -> List[Tuple[str, float]]:
+        usage = []
+        for proc in psutil.process_iter(["name"]):
+            try:
+                usage.append((proc.info["name"] or str(proc.pid), proc.cpu_percent(interval=None)))
+            except psutil.Error:
+                continue
+        usage.sort(key=lambda item: item[1], reverse=True)
+        return usage[: self.top_n]
+
+    def sample(self) -> Sample:
+        """Take one sample now and add it to the buffer."""
+        now = time.monotonic()
+        net = psutil.net_io_counters()
+        elapsed = max(now - self._last_ts, 1e-6)
+        sent_rate = (net.bytes_sent - self._last_net.bytes_sent) / elapsed if self._last_net else 0.0
+        recv_rate = (net.bytes_recv - self._last_net.bytes_recv) / elapsed if self._last_net else 0.0
+        self._last_net, self._last_ts = net, now
+        ram = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        sample = Sample(
+            ts=time.time(),
+            cpu=psutil.cpu_percent(interval=None),
+            ram_percent=ram.percent,
+            ram_used=ram.used,
+            ram_total=ram.total,
+            disk_percent=disk.percent,
+            disk_used=disk.used,
+            disk_total=disk.total,
+            net_sent_rate=max(sent_rate, 0.0),
+            net_recv_rate=max(recv_rate, 0.0),
+            proc_cpu=self._process.cpu_percent(interval=None),
+            proc_rss=self._process.memory_info().rss,
+            top=self._top_processes(),
+        )
+        with self._lock:
+            self.samples.append(sample)
+        self.ready.set()
+        return sample
+
+    def _run(self) -> None:
+        try:
+            self._prime()
+        except Exception as e:
+            logging.error(f"[ERROR] System monitor could not start: {e}")
+            return
+        # Short first wait so a reading is available soon after startup
+        self._stop.wait(min(self.interval, 1.0))
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"[ERROR] System sample failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "SystemMonitor":
+        """Start sampling in a background thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="system-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def latest(self) -> Optional[Sample]:
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def trend(self, minutes: float) -> Optional[Trend]:
+        """Averages and peaks over the samples from the last `minutes`."""
+        cutoff = time.time() - minutes * 60
+        with self._lock:
+            window = [s for s in self.samples if s.ts >= cutoff]
+        if not window:
+            return None
+        n = len(window)
+        return Trend(
+            minutes=(window[-1].ts - window[0].ts) / 60,
+            samples=n,
+            cpu_avg=sum(s.cpu for s in window) / n,
+            cpu_max=max(s.cpu for s in window),
+            ram_avg=sum(s.ram_percent for s in window) / n,
+            ram_max=max(s.ram_percent for s in window),
+            net_sent_avg=sum(s.net_sent_rate for s in window) / n,
+            net_recv_avg=sum(s.net_recv_rate for s in window) / n,
+        )
@@ -0,0 +1,566 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from storage import FileLock, VersionConflict, atomic_write_json, check_version, file_version
+
+
+def parse_due(due: Optional[str]) -> Optional[str]:
+    """Validate an ISO 8601 date or datetime and return it normalized, or raise ValueError."""
+    if not due:
+        return None
+    due = due.strip()
+    try:
+        return datetime.date.fromisoformat(due).isoformat()
+    except ValueError:
+        return datetime.datetime.fromisoformat(due).isoformat(timespec="minutes")
+
+
+def due_bound(due_before: Optional[str]) -> Optional[str]:
+    """Inclusive upper bound for a due-date filter, comparable with stored due values.
+
+    Stored dues are "YYYY-MM-DD" or "YYYY-MM-DDTHH:MM", and a date-only due sorts
+    as the start of its day. A date-only bound means the end of that day, so
+    "due before 2026-10-18" includes a task due at 2026-10-18T09:00.
+    """
+    due_before = parse_due(due_before)
+    if due_before and "T" not in due_before:
+        due_before += "T23:59"
+    return due_before
+
+
+def new_task(task_id: int, text: str, due: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+    """Build a task record."""
+    return {
+        "id": task_id,
+        "text": text,
+        "done": False,
+        "due": due,
+        "tags": sorted({t.strip().lower() for t in tags or [] if t.strip()}),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "completed": None,
+    }
+
+
+def format_task(task: dict) -> str:
+    """Speakable one-line rendering of a task."""
+    line = f"{task['id']}. {task['text']}"
+    if task.get("done"):
+        line += " (done)"
+    if task.get("due"):
+        line += f" - due {task['due']}"
+    if task.get("tags"):
+        line += f" [{', '.join(task['tags'])}]"
+    return line
+
+
+def _matches(task: dict, status: str, tag: Optional[str], due_before: Optional[str]) -> bool:
+    if status == "open" and task["done"]:
+        return False
+    if status == "done" and not task["done"]:
+        return False
+    if tag and tag.lower() not in task["tags"]:
+        return False
+    if due_before and (not task["due"] or task["due"] > due_before):
+        return False
+    return True
+
+
+class TaskStore:
+    """Legacy JSON to-do list held in memory, persisted as a JSON snapshot plus an append-only journal.
+
+    SqliteTaskStore is the default backend. This one is kept to import an
+    existing todo.json into SQLite, and for TASK_BACKEND=json on filesystems
+    where SQLite's WAL mode does not work (network shares).
+
+    Tasks are loaded once and served from memory. Mutations are applied in
+    memory straight away and handed to a write-behind flusher thread, which
+    waits `flush_delay` seconds so a burst of changes is written as one
+    journal append and one fsync. A clear, or a journal past `compact_after`
+    entries, is instead folded into a fresh snapshot written atomically
+    (temp file plus rename). Journal records carry sequence numbers so replay
+    after a crash mid-compaction never applies an operation twice.
+
+    Several worker processes may share the files: all disk access happens under
+    a cross-process file lock, and if the files' version stamps show another
+    process wrote since we last looked, we reload and re-base any unsaved
+    changes on top before writing.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        journal_path: Optional[str] = None,
+        flush_delay: float = 0.5,
+        compact_after: int = 500,
+    ):
+        self.path = path
+        self.journal_path = journal_path or f"{os.path.splitext(path)[0]}.jsonl"
+        self.flush_delay = flush_delay
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._tasks: List[dict] = []
+        self._next_id = 1
+        self._seq = 0
+        self._journal_entries = 0
+        self._pending: List[dict] = []
+        self._wake = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+        self._loaded = False
+        self._file_lock = FileLock(path)
+        self._version = None
+
+    # --- loading ---
+    def _load_snapshot(self) -> None:
+        if not os.path.exists(self.path):
+            logging.debug(f"[DEBUG] No {os.path.basename(self.path)} found at {self.path}, starting fresh.")
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # Keep the damaged file for inspection rather than wiping it
+            backup = f"{self.path}.corrupt-{int(time.time())}"
+            os.replace(self.path, backup)
+            logging.error(f"[ERROR] Could not parse {self.path}: {e}, moved it to {backup}.")
+            return
+        # Older files hold a bare list of task strings
+        if isinstance(data, list):
+            data = {"tasks": data}
+        self._seq = data.get("seq", 0)
+        for task in data.get("tasks", []):
+            self._apply({"op": "add", "task": task})
+        self._next_id = max(self._next_id, data.get("next_id", 1))
+
+    def _replay_journal(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        good_offset = 0
+        with open(self.journal_path, "rb") as f:
+            for raw in f:
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(raw)
+                except ValueError as e:
+                    # A torn final line from a crash mid-append: drop it
+                    logging.error(f"[ERROR] Ignoring damaged journal record in {self.journal_path}: {e}")
+                    break
+                good_offset += len(raw)
+                self._journal_entries += 1
+                if record.get("seq", 0) <= self._seq:
+                    continue  # already folded into the snapshot
+                self._apply(record)
+                self._seq = record["seq"]
+        if good_offset != os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good_offset)
+
+    def _apply(self, record: dict) -> None:
+        op = record.get("op")
+        if op == "add":
+            task = record["task"]
+            if isinstance(task, str):
+                task = new_task(self._next_id, task)
+            self._tasks.append(task)
+            self._next_id = max(self._next_id, task["id"] + 1)
+        elif op == "complete":
+            for task in self._tasks:
+                if task["id"] == record["id"]:
+                    task["done"] = True
+                    task["completed"] = record.get("completed")
+        elif op == "delete":
+            self._tasks = [t for t in self._tasks if t["id"] != record["id"]]
+        elif op == "clear":
+            self._tasks = []
+        else:
+            logging.error(f"[ERROR] Unknown task journal op: {op}")
+
+    def _disk_version(self) -> tuple:
+        return (file_version(self.path), file_version(self.journal_path))
+
+    def _reload(self) -> None:
+        """Re-read the files and replay unsaved local changes on top (file lock held)."""
+        pending = self._pending
+        self._tasks, self._next_id, self._seq, self._journal_entries = [], 1, 0, 0
+        self._load_snapshot()
+        self._replay_journal()
+        self._version = self._disk_version()
+        # Old id -> new id of our renumbered adds, so later records follow them
+        renumbered = {}
+        for record in pending:
+            self._seq += 1
+            record["seq"] = self._seq
+            if record["op"] == "add" and record["task"]["id"] < self._next_id:
+                # Another process used this id meanwhile
+                logging.debug(f"[DEBUG] Task id {record['task']['id']} taken, renumbering to {self._next_id}")
+                renumbered[record["task"]["id"]] = self._next_id
+                record["task"]["id"] = self._next_id
+            elif record["op"] in ("complete", "delete") and record["id"] in renumbered:
+                record["id"] = renumbered[record["id"]]
+            self._apply(dict(record, task=dict(record["task"])) if record["op"] == "add" else record)
+        self._loaded = True
+
+    def load(self) -> None:
+        """Load the task list, or reload it if another process changed the files.
+
+        Lock order is always file lock, then in-process lock, so callers must
+        not hold `_lock` here.
+        """
+        with self._lock:
+            if self._loaded and self._disk_version() == self._version:
+                return
+        with self._file_lock, self._lock:
+            if self._loaded and self._disk_version() == self._version:
+                return
+            self._reload()
+            logging.debug(f"[DEBUG] Loaded {len(self._tasks)} task(s) from {self.path}")
+
+    # --- write-behind ---
+    def _record(self, record: dict) -> None:
+        """Queue a journal record for the flusher (caller holds the lock)."""
+        self._seq += 1
+        record["seq"] = self._seq
+        self._pending.append(record)
+        if self._flusher is None or not self._flusher.is_alive():
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._run_flusher, name="task-flusher", daemon=True)
+            self._flusher.start()
+        self._wake.set()
+
+    def _run_flusher(self) -> None:
+        while not self._stopping:
+            self._wake.wait()
+            if self._stopping:
+                return
+            time.sleep(self.flush_delay)  # let a burst of mutations pile up
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending changes to disk now."""
+        with self._io_lock:
+            try:
+                self._file_lock.acquire()
+            except Exception as e:
+                logging.error(f"[ERROR] Failed to save tasks: {e}")
+                return
+            try:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    if self._disk_version() != self._version:
+                        self._reload()
+                    records, self._pending = self._pending, []
+                    compact = any(r["op"] == "clear" for r in records) or (
+                        self._journal_entries + len(records) >= self.compact_after
+                    )
+                    snapshot = self._snapshot() if compact else None
+                try:
+                    if compact:
+                        self._write_snapshot(snapshot)
+                    else:
+                        self._append_records(records)
+                    self._version = self._disk_version()
+                except VersionConflict as e:
+                    # Someone wrote without the lock: reload and re-base on the next flush
+                    logging.error(f"[ERROR] Task files changed underneath us, retrying: {e}")
+                    with self._lock:
+                        self._pending = records + self._pending
+                        self._loaded = False
+                    self._wake.set()
+                except Exception as e:
+                    logging.error(f"[ERROR] Failed to save tasks: {e}")
+                    with self._lock:
+                        self._pending = records + self._pending
+            finally:
+                self._file_lock.release()
+
+    def _snapshot(self) -> dict:
+        return {"seq": self._seq, "next_id": self._next_id, "tasks": [dict(t) for t in self._tasks]}
+
+    def _append_records(self, records: List[dict]) -> None:
+        # Refuse to extend a journal that changed since we last read it
+        check_version(self.journal_path, self._version[1])
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += len(records)
+        logging.debug(f"[DEBUG] Appended {len(records)} task journal record(s)")
+
+    def _write_snapshot(self, snapshot: dict) -> None:
+        """Fold everything into a fresh snapshot and start a new journal."""
+        atomic_write_json(self.path, snapshot, expected_version=self._version[0], check=True)
+        open(self.journal_path, "w", encoding="utf-8").close()
+        self._journal_entries = 0
+        logging.debug(f"[DEBUG] Compacted task journal into {self.path}")
+
+    def compact(self) -> None:
+        """Flush pending changes and rewrite the snapshot."""
+        with self._io_lock, self._file_lock:
+            self._loaded = False
+            self.load()
+            with self._lock:
+                self._pending = []
+                snapshot = self._snapshot()
+            self._write_snapshot(snapshot)
+            self._version = self._disk_version()
+
+    def close(self) -> None:
+        """Stop the flusher and write out anything still pending."""
+        flusher = self._flusher
+        self._stopping = True
+        self._wake.set()
+        if flusher is not None:
+            flusher.join()
+        self._flusher = None
+        self.flush()
+        if self._pending:
+            # A version conflict put the records back; the retry re-bases them
+            self.flush()
+
+    # --- public API ---
+    def query(
+        self,
+        status: str = "open",
+        tag: Optional[str] = None,
+        due_before: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> Tuple[List[dict], int]:
+        """Return (page of matching tasks, total matches)."""
+        due_before = due_bound(due_before)
+        self.load()
+        with self._lock:
+            matches = [dict(t) for t in self._tasks if _matches(t, status, tag, due_before)]
+        if newest_first:
+            matches.reverse()
+        end = None if limit is None else offset + limit
+        return matches[offset:end], len(matches)
+
+    def add(self, text: str, due: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+        self.load()
+        with self._lock:
+            task = new_task(self._next_id, text, due, tags)
+            self._apply({"op": "add", "task": task})
+            self._record({"op": "add", "task": dict(task)})
+            logging.debug(f"[DEBUG] Added task: {task}")
+            return task
+
+    def complete(self, task_id: int) -> Optional[dict]:
+        self.load()
+        with self._lock:
+            task = next((t for t in self._tasks if t["id"] == task_id), None)
+            if task is None:
+                return None
+            record = {"op": "complete", "id": task_id, "completed": datetime.datetime.now().isoformat(timespec="seconds")}
+            self._apply(record)
+            self._record(record)
+            return dict(task)
+
+    def delete(self, task_id: int) -> Optional[dict]:
+        self.load()
+        with self._lock:
+            task = next((t for t in self._tasks if t["id"] == task_id), None)
+            if task is None:
+                return None
+            self._apply({"op": "delete", "id": task_id})
+            self._record({"op": "delete", "id": task_id})
+            return task
+
+    def clear(self) -> None:
+        self.load()
+        with self._lock:
+            self._tasks = []
+            self._record({"op": "clear"})
+            logging.debug("[DEBUG] Cleared tasks")
+
+
+class SqliteTaskStore:
+    """To-do list in SQLite (WAL mode), indexed on completion state, due date and tag."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            due TEXT,
+            created TEXT NOT NULL,
+            completed TEXT
+        );
+        CREATE TABLE IF NOT EXISTS task_tags (
+            task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (tag, task_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_done ON tasks(done, id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(done, due);
+        CREATE INDEX IF NOT EXISTS idx_task_tags_task ON task_tags(task_id);
+    """
+
+    def __init__(self, path: str, import_from: Optional[str] = None):
+        self.path = path
+        self.import_from = import_from
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self) -> None:
+        """One-time import of an existing JSON task list into an empty database."""
+        # user_version marks the import as done, so clearing the database never
+        # re-imports; BEGIN IMMEDIATE keeps two workers from importing twice
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                self._conn.rollback()
+                return
+            tasks = []
+            if self.import_from and os.path.exists(self.import_from):
+                tasks, _ = TaskStore(self.import_from).query(status="all")
+            for task in tasks:
+                self._insert(task)
+            self._conn.execute("PRAGMA user_version = 1")
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        if tasks:
+            logging.info(f"[INFO] Imported {len(tasks)} task(s) from {self.import_from} into {self.path}")
+
+    def _insert(self, task: dict) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO tasks (text, done, due, created, completed) VALUES (?, ?, ?, ?, ?)",
+            (task["text"], int(task["done"]), task["due"], task["created"], task["completed"]),
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO task_tags (task_id, tag) VALUES (?, ?)",
+            [(cur.lastrowid, tag) for tag in task["tags"]],
+        )
+        return cur.lastrowid
+
+    def _row_to_task(self, row: sqlite3.Row, tags: List[str]) -> dict:
+        return {
+            "id": row["id"],
+            "text": row["text"],
+            "done": bool(row["done"]),
+            "due": row["due"],
+            "tags": tags,
+            "created": row["created"],
+            "completed": row["completed"],
+        }
+
+    def _get(self, task_id: int) -> Optional[dict]:
+        row = self._conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        tags = [r["tag"] for r in self._conn.execute("SELECT tag FROM task_tags WHERE task_id = ? ORDER BY tag", (task_id,))]
+        return self._row_to_task(row, tags)
+
+    def query(
+        self,
+        status: str = "open",
+        tag: Optional[str] = None,
+        due_before: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> Tuple[List[dict], int]:
+        """Return (page of matching tasks, total matches)."""
+        due_before = due_bound(due_before)
+        where, params = [], []
+        if status == "open":
+            where.append("done = 0")
+        elif status == "done":
+            where.append("done = 1")
+        if tag:
+            where.append("id IN (SELECT task_id FROM task_tags WHERE tag = ?)")
+            params.append(tag.lower())
+        if due_before:
+            where.append("due IS NOT NULL AND due <= ?")
+            params.append(due_before)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM tasks {clause}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM tasks {clause} ORDER BY id {'DESC' if newest_first else 'ASC'} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+            tags = {}
+            if rows:
+                ids = [row["id"] for row in rows]
+                marks = ",".join("?" * len(ids))
+                for r in conn.execute(f"SELECT task_id, tag FROM task_tags WHERE task_id IN ({marks}) ORDER BY tag", ids):
+                    tags.setdefault(r["task_id"], []).append(r["tag"])
+        return [self._row_to_task(row, tags.get(row["id"], [])) for row in rows], total
+
+    def add(self, text: str, due: Optional[str] = None, tags: Optional[List[str]] = None) -> dict:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                task_id = self._insert(new_task(0, text, due, tags))
+            logging.debug(f"[DEBUG] Added task {task_id}: {text}")
+            return self._get(task_id)
+
+    def complete(self, task_id: int) -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cur = conn.execute(
+                    "UPDATE tasks SET done = 1, completed = ? WHERE id = ?",
+                    (datetime.datetime.now().isoformat(timespec="seconds"), task_id),
+                )
+            return self._get(task_id) if cur.rowcount else None
+
+    def delete(self, task_id: int) -> Optional[dict]:
+        with self._lock:
+            conn = self._connect()
+            task = self._get(task_id)
+            if task is not None:
+                with conn:
+                    conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            return task
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM tasks")
+            logging.debug("[DEBUG] Cleared tasks")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def open_task_store(backend: str, json_path: str, db_path: str):
+    """Pick the task backend: 'sqlite' (the default) or the legacy 'json' store."""
+    if backend == "json":
+        logging.info(f"[INFO] Using the legacy JSON task store at {json_path}")
+        return TaskStore(json_path)
+    if backend != "sqlite":
+        logging.error(f"[ERROR] Unknown TASK_BACKEND '{backend}', using sqlite.")
+    return SqliteTaskStore(db_path, import_from=json_path)
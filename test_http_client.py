@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+
+SLOW_RESPONSE = 0.5
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(SLOW_RESPONSE)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_does_not_block_event_loop(stub_url):
+    async def main():
+        gaps = []
+
+        async def ticker():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        try:
+            response = await http_client.get(stub_url)
+        finally:
+            tick.cancel()
+            await http_client.aclose()
+        return response, gaps
+
+    response, gaps = asyncio.run(main())
+    assert response.status_code == 200 and response.text == "ok"
+    # The loop kept ticking for the whole slow response
+    assert sum(gaps) >= SLOW_RESPONSE * 0.8
+    assert max(gaps) < 0.2
+
+
+def test_client_from_previous_loop_is_closed(stub_url):
+    async def first():
+        await http_client.get(stub_url)
+        return http_client.get_client()
+
+    async def second():
+        client = http_client.get_client()
+        await asyncio.sleep(0.05)
+        await http_client.aclose()
+        return client
+
+    old = asyncio.run(first())
+    new = asyncio.run(second())
+    assert new is not old
+    assert old.is_closed
+
+
+def test_client_survives_until_process_close(stub_url):
+    async def job():
+        await http_client.get(stub_url)
+        return http_client.get_client()
+
+    loop = asyncio.new_event_loop()
+    try:
+        client = loop.run_until_complete(job())
+        # Another job finishing must not close it; only the exit hook does
+        assert not client.is_closed
+        http_client.close()
+        assert client.is_closed
+    finally:
+        loop.close()
@@ -0,0 +1,150 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from mailer import MailSender
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; records every command it sees."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].split(":", 1)[0].upper()
+            with server.lock:
+                server.commands.append(verb)
+            if verb == "EHLO":
+                self.reply("250-stub")
+                self.reply("250 PIPELINING")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 ok")
+            elif verb == "DATA":
+                with server.lock:
+                    drop = server.drop_data > 0
+                    server.drop_data -= drop
+                if drop:
+                    # Hang up mid-transaction, like a server timing the session out
+                    return
+                self.reply("354 go ahead")
+                body = []
+                while True:
+                    data = self.rfile.readline().decode()
+                    if data in (".\r\n", ""):
+                        break
+                    body.append(data)
+                with server.lock:
+                    server.messages.append("".join(body))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                with server.lock:
+                    server.quits += 1
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+@pytest.fixture
+def smtp_stub():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubSMTPHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.quits = 0
+    server.drop_data = 0
+    server.commands = []
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_sender(server, **kwargs):
+    return MailSender("127.0.0.1", server.server_address[1], workers=1, starttls=False, **kwargs).start()
+
+
+def test_queued_jobs_share_one_session(smtp_stub):
+    sender = make_sender(smtp_stub)
+    try:
+        first = sender.submit("me@example.com", ["a@example.com"], "Subject: one\r\n\r\nhello")
+        second = sender.submit("me@example.com", ["b@example.com", "c@example.com"], "Subject: two\r\n\r\nhi")
+        sender.join()
+    finally:
+        sender.stop()
+    assert first.status == "sent" and second.status == "sent"
+    assert second.results == {"b@example.com": "sent", "c@example.com": "sent"}
+    assert len(smtp_stub.messages) == 2
+    # The warm session carried both jobs
+    assert smtp_stub.connections == 1
+
+
+def test_dropped_session_is_retried(smtp_stub):
+    smtp_stub.drop_data = 1
+    sender = make_sender(smtp_stub)
+    try:
+        job = sender.submit("me@example.com", ["a@example.com"], "Subject: retry\r\n\r\nhello")
+        sender.join()
+    finally:
+        sender.stop()
+    assert job.status == "sent"
+    assert job.attempts == 2
+    assert smtp_stub.connections == 2
+    assert len(smtp_stub.messages) == 1
+
+
+def test_retries_give_up_and_report_failure(smtp_stub):
+    smtp_stub.drop_data = 10
+    sender = make_sender(smtp_stub, max_retries=1)
+    try:
+        job = sender.submit("me@example.com", ["a@example.com"], "Subject: nope\r\n\r\nhello")
+        sender.join()
+    finally:
+        sender.stop()
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert job.results == {"a@example.com": "failed"}
+
+
+def test_idle_session_is_closed(smtp_stub):
+    sender = make_sender(smtp_stub, idle_timeout=0.2)
+    try:
+        sender.submit("me@example.com", ["a@example.com"], "Subject: idle\r\n\r\nhello")
+        sender.join()
+        deadline = time.monotonic() + 2
+        while smtp_stub.quits == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert smtp_stub.quits == 1
+        # The next job opens a fresh session
+        job = sender.submit("me@example.com", ["b@example.com"], "Subject: again\r\n\r\nhello")
+        sender.join()
+    finally:
+        sender.stop()
+    assert job.status == "sent"
+    assert smtp_stub.connections == 2
+
+
+def test_stale_session_is_probed_with_noop(smtp_stub):
+    sender = make_sender(smtp_stub, check_after=0)
+    try:
+        sender.submit("me@example.com", ["a@example.com"], "Subject: one\r\n\r\nhello")
+        sender.join()
+        sender.submit("me@example.com", ["b@example.com"], "Subject: two\r\n\r\nhello")
+        sender.join()
+    finally:
+        sender.stop()
+    assert "NOOP" in smtp_stub.commands
+    assert smtp_stub.connections == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from math_text import normalize_expression
+
+
+@pytest.mark.parametrize("spoken, canonical", [
+    ("What is two times three?", "2*3"),
+    ("2 x 3", "2*3"),
+    ("  2 *   3 ", "2*3"),
+    ("3x4", "3*4"),
+    ("twenty one plus four", "21+4"),
+    ("two thousand twenty four", "2024"),
+    ("three hundred and five", "305"),
+    ("one two three", "1 2 3"),
+    ("x squared minus four equals zero", "x^2-4=0"),
+    ("Solve x squared minus four equals zero", "Solve x^2-4=0"),
+    ("two to the power of ten", "2^10"),
+    ("three point five times 2", "3.5*2"),
+    ("the square root of 16", "sqrt(16)"),
+    ("12 over 4", "12/4"),
+    ("x**2 + 1 at x = 3", "x^2+1 at x=3"),
+    ("integrate sin(x) dx", "integrate sin(x) dx"),
+    ("I^2", "I^2"),
+])
+def test_normalize(spoken, canonical):
+    assert normalize_expression(spoken) == canonical
+
+
+# Typed requests the solver already understands must get the same answer after normalizing
+SOLVER_INPUTS = [
+    "2*3",
+    "x^2 + 2x - 1",
+    "solve x^2 - 4 = 0",
+    "solve for x: 2x + 1 = 5",
+    "x + y = 3, x - y = 1",
+    "integrate x^2 from 0 to 1",
+    "integrate x^2 from 0 to 1 dx",
+    "integrate sin(x) dx",
+    "the integral of e^x",
+    "derivative of sin(x) with respect to x",
+    "derivative of x^3 d/dx",
+    "derivative of x^2 at x = 3",
+    "factor x^2 - 1",
+    "expand (x + 1)^3",
+    "simplify (x^2 - 1)/(x - 1)",
+    "x^2 + 1 at x = 3",
+    "evaluate x^2 + y at x = 3, y = 2",
+    "I^2",
+    "E^2",
+    "2 (3 + 4)",
+    "sqrt(16)",
+    "cos(pi)",
+    "theta^2 + theta",
+    "X^2 + x at x = 1",
+]
+
+
+@pytest.mark.parametrize("text", SOLVER_INPUTS)
+def test_normalized_input_gives_same_answer(text):
+    math_solver = pytest.importorskip("math_solver")
+    assert math_solver.solve_text(normalize_expression(text)) == math_solver.solve_text(text)
+
+
+@pytest.mark.parametrize("text, answer", [
+    ("1/0", "undefined"),
+    ("0/0", "undefined"),
+    ("1/x at x = 0", "undefined"),
+    ("oo", "infinity"),
+    ("sqrt(x) at x = -1", "i"),
+])
+def test_undefined_results_are_spoken(text, answer):
+    math_solver = pytest.importorskip("math_solver")
+    assert math_solver.solve_text(normalize_expression(text)) == answer
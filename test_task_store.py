@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from storage import VersionConflict, atomic_write_json, file_version
+from task_store import SqliteTaskStore, TaskStore, new_task, parse_due
+
+
+def open_store(tmp_path) -> TaskStore:
+    # Flushes are triggered explicitly, never by the background flusher
+    return TaskStore(str(tmp_path / "todo.json"), flush_delay=3600)
+
+
+def test_rebase_follows_renumbered_ids(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    a.load()
+    b.load()
+    # A adds and completes its task 1 while B, unaware, also adds a task 1
+    mine = a.add("from A")
+    a.complete(mine["id"])
+    b.add("from B")
+    b.flush()
+    a.flush()
+
+    tasks, _ = open_store(tmp_path).query(status="all")
+    done = {t["text"]: t["done"] for t in tasks}
+    assert done == {"from A": True, "from B": False}
+    assert sorted(t["id"] for t in tasks) == [1, 2]
+
+
+def test_rebase_delete_follows_renumbered_id(tmp_path):
+    a, b = open_store(tmp_path), open_store(tmp_path)
+    a.load()
+    b.load()
+    a.add("temporary")
+    a.delete(1)
+    b.add("keep")
+    b.flush()
+    a.flush()
+
+    tasks, _ = open_store(tmp_path).query(status="all")
+    assert [t["text"] for t in tasks] == ["keep"]
+
+
+def test_unlocked_write_is_not_overwritten(tmp_path):
+    store = open_store(tmp_path)
+    store.add("mine")
+    append = store._append_records
+
+    def racing_append(records):
+        # A writer that ignores the lock (say, an older build) slips in just before our write
+        store._append_records = append
+        with open(store.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "add", "task": new_task(1, "theirs"), "seq": 1}) + "\n")
+        append(records)
+
+    store._append_records = racing_append
+    store.flush()
+    # The write was refused and kept for the retry, which re-bases it
+    assert store._pending
+    store.flush()
+    assert not store._pending
+
+    tasks, _ = open_store(tmp_path).query(status="all")
+    assert sorted(t["text"] for t in tasks) == ["mine", "theirs"]
+    assert sorted(t["id"] for t in tasks) == [1, 2]
+
+
+def test_version_checked_write_refuses_changed_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    atomic_write_json(path, [1])
+    version = file_version(path)
+    atomic_write_json(path, [1, 2])
+    with pytest.raises(VersionConflict):
+        atomic_write_json(path, [1, 3], expected_version=version, check=True)
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == [1, 2]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_due_before_date_includes_times_that_day(tmp_path, backend):
+    store = open_store(tmp_path) if backend == "json" else SqliteTaskStore(str(tmp_path / "tasks.db"))
+    store.add("morning", due=parse_due("2026-10-18T09:00"))
+    store.add("all day", due=parse_due("2026-10-18"))
+    store.add("tomorrow", due=parse_due("2026-10-19"))
+
+    tasks, _ = store.query(due_before="2026-10-18")
+    assert sorted(t["text"] for t in tasks) == ["all day", "morning"]
+    # A time bound still cuts within the day; a date-only due counts from its start
+    tasks, _ = store.query(due_before="2026-10-18T08:00")
+    assert [t["text"] for t in tasks] == ["all day"]
@@ -1,25 +1,24 @@
+import asyncio
+import atexit
+import hashlib
 import logging
 import secrets
 import string
-import smtplib
-import requests
 import os
-import json
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
+from email.utils import parseaddr
 
-import psutil
-import sympy
 import wikipedia
 import pint
 import time
 import threading
 import datetime
 import pytz
-from sympy import sympify
 from pint import UnitRegistry
 
 # For news and jokes/quotes
@@ -35,74 +34,206 @@ import pickle
 # For currency conversion
 # We'll use exchangerate.host (no API key required)
 
-from livekit.agents import function_tool, RunContext
+from livekit.agents import function_tool as livekit_function_tool, RunContext
 from langchain_community.tools import DuckDuckGoSearchRun
 
+import http_client
+import metrics
+from cache import TTLCache, normalize_key
+from mailer import get_mail_sender, is_template, render_template
+from math_engine import MathPool, MathTimeout
+from math_text import normalize_expression
+from content_search import ContentSearch, FileHits
+from extractors import Extraction, Extractor, MissingDependency, get_extractor
+from file_reader import looks_like_text, read_head, read_range, read_tail
+from file_search import BoundedWalk, FileIndex, default_roots, home_dir, nested_roots
+from notes_store import NotesStore
+from system_monitor import SystemMonitor
+from task_store import format_task, open_task_store, parse_due
+
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)
 
+def function_tool(**kwargs):
+    """livekit's function_tool, with call count, errors and latency recorded for every tool."""
+    def decorator(fn):
+        return livekit_function_tool(**kwargs)(metrics.instrument(fn))
+    return decorator
+
+# --- LIST PAGINATION ---
+# Task and note listings go straight back to the realtime model, so every page
+# is bounded in entries and characters no matter how big the store gets.
+PAGE_LIMIT_MAX = 25
+PAGE_ENTRY_CHARS = 400
+SUMMARY_ENTRIES = 3
+SUMMARY_ENTRY_CHARS = 80
+
+def _listing_key(listing: dict) -> str:
+    """Short fingerprint of what a listing shows: its filters and ordering."""
+    return hashlib.sha1(repr(sorted(listing.items())).encode()).hexdigest()[:6]
+
+def encode_cursor(offset: int, listing: dict) -> str:
+    """Opaque-enough token the model passes back to get the next page of the same listing."""
+    return f"next:{offset}:{_listing_key(listing)}"
+
+def decode_cursor(cursor: str, listing: dict) -> int:
+    """Offset from a cursor, or ValueError if it is malformed or from a listing with other filters or order."""
+    try:
+        _, offset, key = str(cursor).split(":")
+        offset = int(offset)
+    except ValueError:
+        raise ValueError("That cursor is not valid. Ask again without a cursor to start from the top.")
+    if key != _listing_key(listing):
+        raise ValueError("That cursor came from a list with different filters or order. Use the same ones, or ask again without a cursor.")
+    return max(offset, 0)
+
+def clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[: limit - 3].rstrip() + "..."
+
+def render_page(entries: List[str], total: int, offset: int, noun: str, listing: dict, summary: bool = False) -> str:
+    """Join one page of entries and say how to get the rest."""
+    if summary:
+        lines = [f"You have {total} {noun}."] + [clip(" ".join(e.split()), SUMMARY_ENTRY_CHARS) for e in entries]
+    else:
+        lines = [clip(e, PAGE_ENTRY_CHARS) for e in entries]
+    end = offset + len(entries)
+    if not entries:
+        lines.append(f"No more {noun}.")
+    elif end < total:
+        lines.append(f"Showing {offset + 1} to {end} of {total} {noun}. For more, use cursor '{encode_cursor(end, listing)}'.")
+    elif offset:
+        lines.append(f"Showing {offset + 1} to {end} of {total} {noun}.")
+    return "\n".join(lines)
+
 # Windows-safe path handling
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 TODO_FILE = os.path.join(os.getcwd(), "todo.json")
+TASKS_DB = os.path.join(os.getcwd(), "tasks.db")
+task_store = open_task_store(os.getenv("TASK_BACKEND", "sqlite"), TODO_FILE, TASKS_DB)
+atexit.register(task_store.close)
 
-def load_tasks():
-    """Load tasks from todo.json"""
-    if not os.path.exists(TODO_FILE):
-        logging.debug(f"[DEBUG] No todo.json found at {TODO_FILE}, starting fresh.")
-        return []
-    try:
-        with open(TODO_FILE, "r", encoding="utf-8") as f:
-            tasks = json.load(f)
-            logging.debug(f"[DEBUG] Loaded tasks: {tasks}")
-            return tasks
-    except json.JSONDecodeError as e:
-        logging.error(f"[ERROR] JSON decode error: {e}, resetting todo.json.")
-        save_tasks([])  # Reset the file to an empty list
-        return []
-    except Exception as e:
-        logging.error(f"[ERROR] Failed to read {TODO_FILE}: {e}")
-        return []
+async def flush_stores() -> None:
+    """Write out buffered task changes (call on worker shutdown)."""
+    await asyncio.get_running_loop().run_in_executor(None, task_store.close)
 
-def save_tasks(tasks):
-    """Save tasks to todo.json"""
-    try:
-        with open(TODO_FILE, "w", encoding="utf-8") as f:
-            json.dump(tasks, f, indent=2, ensure_ascii=False)
-            logging.debug(f"[DEBUG] Saved tasks: {tasks}")
-    except Exception as e:
-        logging.error(f"[ERROR] Failed to save tasks: {e}")
+# --- WEATHER ---
+# Weather reports are cached per city so repeat asks (and concurrent sessions) share one fetch.
+weather_cache = TTLCache(
+    "weather",
+    maxsize=int(os.getenv("WEATHER_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+)
+metrics.registry.register_cache(weather_cache)
+
+async def fetch_weather(city: str) -> str:
+    """Fetch the weather for a city, served from the TTL cache when fresh."""
+    key = normalize_key(city)
+
+    async def fetch() -> str:
+        response = await http_client.get(f"http://wttr.in/{key}?format=3")
+        if response.status_code != 200:
+            raise RuntimeError(f"Weather fetch failed with status: {response.status_code}")
+        return response.text.strip()
+
+    return await weather_cache.get_or_fetch(key, fetch)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks = set()
+
+def prefetch_weather(city: str) -> asyncio.Task:
+    """Start warming the weather cache for a city in the background."""
+    async def runner():
+        try:
+            await fetch_weather(city)
+            logging.debug(f"[DEBUG] Prefetched weather for {city}")
+        except Exception as e:
+            logging.error(f"[ERROR] Weather prefetch failed for {city}: {e}")
+    task = asyncio.create_task(runner())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
 @function_tool()
 async def get_weather(context: RunContext, city: str) -> str:
     """Get current weather for a city."""
     try:
-        response = requests.get(f"http://wttr.in/{city}?format=3")
-        if response.status_code == 200:
-            return response.text.strip()
-        else:
-            logging.error(f"[ERROR] Weather fetch failed with status: {response.status_code}")
-            return f"Couldn't fetch weather for {city}."
+        return await fetch_weather(city)
     except Exception as e:
+        metrics.registry.record_error()
         logging.error(f"[ERROR] Exception in get_weather: {e}")
         return f"Couldn't fetch weather for {city}."
 
+# --- WEB SEARCH ---
+# One search backend for the whole process; blocking calls run in a small worker
+# pool, behind a concurrency limit so bursts from many rooms don't trip rate limits.
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+_search_backend = None
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+SEARCH_MAX_CONCURRENT = int(os.getenv("SEARCH_MAX_CONCURRENT", str(SEARCH_WORKERS)))
+# Semaphores bind to the loop they are first used on, so keep one per running loop
+_search_limiter: Optional[asyncio.Semaphore] = None
+_search_limiter_loop: Optional[asyncio.AbstractEventLoop] = None
+search_cache = TTLCache(
+    "search",
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "900")),
+)
+metrics.registry.register_cache(search_cache)
+
+def get_search_backend() -> DuckDuckGoSearchRun:
+    """Return the shared DuckDuckGo search tool, building it on first use."""
+    global _search_backend
+    if _search_backend is None:
+        _search_backend = DuckDuckGoSearchRun()
+    return _search_backend
+
+def get_search_limiter() -> asyncio.Semaphore:
+    """Return the search concurrency limit for the running event loop."""
+    global _search_limiter, _search_limiter_loop
+    loop = asyncio.get_running_loop()
+    if _search_limiter is None or _search_limiter_loop is not loop:
+        _search_limiter = asyncio.Semaphore(SEARCH_MAX_CONCURRENT)
+        _search_limiter_loop = loop
+    return _search_limiter
+
+async def run_search(query: str) -> str:
+    """Run a web search off the event loop, served from the cache when fresh."""
+    key = normalize_key(query)
+
+    async def fetch() -> str:
+        async with get_search_limiter():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_search_executor, lambda: get_search_backend().run(tool_input=query))
+
+    return await search_cache.get_or_fetch(key, fetch)
+
 @function_tool()
 async def search_web(context: RunContext, query: str) -> str:
     """Search the web using DuckDuckGo."""
     try:
-        results = DuckDuckGoSearchRun().run(tool_input=query)
+        results = await run_search(query)
         logging.info(f"[INFO] Search results for '{query}': {results}")
         return results
     except Exception as e:
+        metrics.registry.record_error()
         logging.error(f"[ERROR] Search error: {e}")
         return f"Could not perform search for '{query}'."
 
+def build_message(sender: str, subject: str, body: str, to: List[str], cc: Optional[List[str]] = None) -> str:
+    """Render a plain-text email with the given visible recipients."""
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = ", ".join(to)
+    msg["Subject"] = subject
+    if cc:
+        msg["Cc"] = ", ".join(cc)
+    msg.attach(MIMEText(body, "plain"))
+    return msg.as_string()
+
 @function_tool()
 async def send_email(context: RunContext, to_email: str, subject: str, message: str, cc_email: Optional[str] = None) -> str:
-    """Send an email via Gmail SMTP."""
+    """Send an email via Gmail SMTP. The message is queued and delivered in the background."""
     try:
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-
         gmail_user = os.getenv("gmail_user")
         gmail_password = os.getenv("gmail_password")
 
@@ -110,53 +241,135 @@ async def send_email(context: RunContext, to_email: str, subject: str, message:
             logging.error("[ERROR] Gmail credentials missing.")
             return "Gmail credentials not set in environment."
 
-        msg = MIMEMultipart()
-        msg["From"] = gmail_user
-        msg["To"] = to_email
-        msg["Subject"] = subject
-
         recipients = [to_email]
         if cc_email:
-            msg["Cc"] = cc_email
             recipients.append(cc_email)
+        msg = build_message(gmail_user, subject, message, [to_email], [cc_email] if cc_email else None)
 
-        msg.attach(MIMEText(message, "plain"))
+        job = get_mail_sender().submit(gmail_user, recipients, msg)
+        logging.info(f"[INFO] Email {job.id} queued for {recipients}")
+        return f"Email to {to_email} queued for sending (id {job.id})."
+    except Exception as e:
+        metrics.registry.record_error()
+        logging.error(f"[ERROR] Failed to send email: {e}")
+        return "Failed to send the email."
 
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(gmail_user, gmail_password)
-        server.sendmail(gmail_user, recipients, msg.as_string())
-        server.quit()
+@function_tool()
+async def send_bulk_email(context: RunContext, recipients: List[str], subject: str, message: str, bcc: Optional[List[str]] = None) -> str:
+    """
+    Send an email to many recipients at once over a single SMTP session.
+    Recipients may be plain addresses or 'Name <address>'. Use {name}, {first_name} or {email}
+    in the subject or message to personalize each copy; otherwise everyone shares one message.
+    BCC addresses receive the email without being shown to the other recipients (not available
+    for personalized emails, where every copy is addressed to its own recipient).
+    """
+    try:
+        gmail_user = os.getenv("gmail_user")
+        gmail_password = os.getenv("gmail_password")
 
-        logging.info(f"[INFO] Email sent to {recipients}")
-        return f"Email sent to {to_email}."
-    except smtplib.SMTPAuthenticationError as e:
-        logging.error(f"[ERROR] SMTP Auth Error: {e}")
-        return "Authentication with SMTP failed."
+        if not gmail_user or not gmail_password:
+            logging.error("[ERROR] Gmail credentials missing.")
+            return "Gmail credentials not set in environment."
+        if not recipients:
+            return "Who should I send the email to?"
+
+        bcc = bcc or []
+        if is_template(subject, message):
+            if bcc:
+                # Each personalized copy names its recipient in To:, which would give BCC away
+                return "Personalized emails can't have BCC recipients. Add them as recipients, or send without {name} placeholders."
+            # One personalized copy per person, all sent over the same session
+            envelopes = [
+                ([parseaddr(rcpt)[1]], build_message(gmail_user, render_template(subject, rcpt), render_template(message, rcpt), [rcpt]))
+                for rcpt in recipients
+            ]
+        else:
+            addresses = [parseaddr(rcpt)[1] for rcpt in recipients + bcc]
+            envelopes = [(addresses, build_message(gmail_user, subject, message, recipients))]
+
+        job = get_mail_sender().submit_batch(gmail_user, envelopes)
+        logging.info(f"[INFO] Batch email {job.id} queued for {job.recipients}")
+        return f"Email to {len(job.recipients)} recipient(s) queued for sending (id {job.id})."
     except Exception as e:
-        logging.error(f"[ERROR] Failed to send email: {e}")
+        metrics.registry.record_error()
+        logging.error(f"[ERROR] Failed to queue batch email: {e}")
         return "Failed to send the email."
 
 @function_tool()
-async def add_task(context: RunContext, task: str) -> str:
-    """Add a task to the to-do list."""
-    tasks = load_tasks()
-    tasks.append(task)
-    save_tasks(tasks)
-    return f"Task added: {task}"
+async def get_email_status(context: RunContext, email_id: Optional[str] = None) -> str:
+    """Check the delivery status of a queued email. Defaults to the most recent one."""
+    sender = get_mail_sender()
+    job = sender.status(email_id) if email_id else sender.latest()
+    if job is None:
+        return f"No email found with id {email_id}." if email_id else "No emails have been sent yet."
+    if len(job.recipients) > 1:
+        return f"{job.describe()}\n{job.report()}"
+    return job.describe()
 
 @function_tool()
-async def list_tasks(context: RunContext) -> str:
-    """List all to-do tasks."""
-    tasks = load_tasks()
-    if not tasks:
+async def add_task(context: RunContext, task: str, due: Optional[str] = None, tags: Optional[List[str]] = None) -> str:
+    """Add a task to the to-do list. Optional due date in ISO format (e.g. '2025-07-22' or '2025-07-22T15:00') and tags."""
+    try:
+        due = parse_due(due)
+    except ValueError:
+        return "When is it due? (Please say a date like '2025-07-22')"
+    created = await asyncio.to_thread(task_store.add, task, due=due, tags=tags)
+    return f"Task added: {format_task(created)}"
+
+@function_tool()
+async def list_tasks(
+    context: RunContext,
+    status: str = "open",
+    tag: Optional[str] = None,
+    due_before: Optional[str] = None,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+    newest_first: bool = False,
+    summary: bool = False,
+) -> str:
+    """
+    List to-do tasks a page at a time. status is 'open', 'done' or 'all'; filter by tag or due date.
+    Pass the cursor from a previous answer to hear the next page. Set newest_first to start with
+    the latest tasks, or summary for a short overview.
+    """
+    try:
+        due_before = parse_due(due_before)
+    except ValueError:
+        return "Please give the due date like '2025-07-22'."
+    listing = {"list": "tasks", "status": status, "tag": tag.lower() if tag else None, "due_before": due_before, "newest_first": newest_first}
+    try:
+        offset = decode_cursor(cursor, listing) if cursor else max(offset, 0)
+    except ValueError as e:
+        return str(e)
+    limit = SUMMARY_ENTRIES if summary else min(max(limit, 1), PAGE_LIMIT_MAX)
+    tasks, total = await asyncio.to_thread(
+        task_store.query, status=status, tag=tag, due_before=due_before, offset=offset, limit=limit, newest_first=newest_first
+    )
+    if not total:
         return "No tasks in the list."
-    return "\n".join(f"{i+1}. {t}" for i, t in enumerate(tasks))
+    return render_page([format_task(t) for t in tasks], total, offset, "tasks", listing, summary)
+
+@function_tool()
+async def complete_task(context: RunContext, task_id: int) -> str:
+    """Mark a single to-do task as done by its number."""
+    task = await asyncio.to_thread(task_store.complete, task_id)
+    if task is None:
+        return f"No task with number {task_id}."
+    return f"Marked done: {task['text']}"
+
+@function_tool()
+async def delete_task(context: RunContext, task_id: int) -> str:
+    """Delete a single to-do task by its number."""
+    task = await asyncio.to_thread(task_store.delete, task_id)
+    if task is None:
+        return f"No task with number {task_id}."
+    return f"Task deleted: {task['text']}"
 
 @function_tool()
 async def clear_tasks(context: RunContext) -> str:
     """Clear all to-do tasks."""
-    save_tasks([])
+    await asyncio.to_thread(task_store.clear)
     return "All tasks cleared."
 
 
@@ -199,108 +412,309 @@ def is_text_file(filepath: str, blocksize: int = 512) -> bool:
     """Check if a file is likely a text file."""
     try:
         with open(filepath, 'rb') as f:
-            chunk = f.read(blocksize)
-            if b'\0' in chunk:
-                return False
-            # Try decoding as utf-8
-            try:
-                chunk.decode('utf-8')
-                return True
-            except UnicodeDecodeError:
-                return False
+            return looks_like_text(f.read(blocksize))
     except Exception as e:
         logging.error(f"[ERROR] Could not check file type: {e}")
         return False
 
 
-def find_file(filename: str, search_dir: str = ".", max_depth: int = 5) -> Tuple[str, str]:
-    """Find a file by name within a directory up to a certain depth. Returns (full_path, root) or (None, None) if not found."""
-    search_dir = os.path.abspath(search_dir)
-    for root, _, files in os.walk(search_dir):
-        # Calculate depth
-        rel_path = os.path.relpath(root, search_dir)
-        depth = rel_path.count(os.sep)
-        if depth > max_depth:
-            continue
-        if filename in files:
-            return os.path.join(root, filename), root
+FILE_SEARCH_BUDGET = float(os.getenv("FILE_SEARCH_BUDGET", "5"))
+# Most bytes of a file returned per read; longer files are paged
+FILE_READ_BUDGET = int(os.getenv("FILE_READ_BUDGET", "4000"))
+
+# Text extracted from documents (PDF, DOCX, ...), keyed by (path, mtime, size) so an
+# edited file is extracted afresh while re-reads and "next part" requests are free.
+document_cache = TTLCache(
+    "documents",
+    maxsize=int(os.getenv("DOCUMENT_CACHE_SIZE", "16")),
+    ttl=float(os.getenv("DOCUMENT_CACHE_TTL", "3600")),
+    # Dropped documents stop their extractor so it lets go of the file. Closing
+    # waits for any read in progress on that document, so it gets its own thread.
+    on_evict=lambda document: _document_closer.submit(document.close),
+)
+metrics.registry.register_cache(document_cache)
+_document_closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="document-close")
+_document_lock = threading.Lock()
+
+def open_document(path: str, extractor: Extractor) -> Extraction:
+    """Cached extraction for a document (blocking: call it from a worker thread)."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _document_lock:
+        document_cache.purge()
+        document = document_cache.get(key)
+        if document is None:
+            document = Extraction(path, extractor)
+            document_cache.set(key, document)
+    return document
+# A fuzzy filename match is used directly only when it is this good and this far ahead of the runner-up
+FILE_FUZZY_ACCEPT = float(os.getenv("FILE_FUZZY_ACCEPT", "0.8"))
+FILE_FUZZY_MARGIN = 0.05
+
+# Background filename index over the user's folders (Documents, Downloads, Desktop, Pictures, Music, Videos)
+file_index = FileIndex(
+    os.path.join(BASE_DIR, "file_index.json"),
+    interval=float(os.getenv("FILE_INDEX_INTERVAL", "300")),
+)
+
+# Walkers for parallel searches over several folders at once
+FILE_SEARCH_WORKERS = int(os.getenv("FILE_SEARCH_WORKERS", "4"))
+_file_search_executor = ThreadPoolExecutor(max_workers=FILE_SEARCH_WORKERS, thread_name_prefix="file-search")
+
+def find_file(
+    filename: str,
+    search_dir: str = ".",
+    max_depth: int = 5,
+    budget: float = FILE_SEARCH_BUDGET,
+    cancel: Optional[threading.Event] = None,
+    exclude: Tuple[str, ...] = (),
+) -> Tuple[str, str]:
+    """Find a file by name up to max_depth directories below search_dir, within a time budget. Returns (full_path, root) or (None, None) if not found."""
+    walk = BoundedWalk(search_dir, max_depth=max_depth, budget=budget, cancel=cancel, exclude=exclude)
+    for entry in walk:
+        if entry.name == filename:
+            return entry.path, os.path.dirname(entry.path)
+    if walk.timed_out:
+        logging.info(f"[INFO] Search for '{filename}' in {search_dir} hit the {budget}s budget")
     return None, None
 
+def _depth_below(path: str, root: str) -> int:
+    rel = os.path.relpath(os.path.dirname(path), root)
+    return 0 if rel == "." else rel.count(os.sep) + 1
+
+def lookup_indexed(filename: str, search_dirs: List[str], max_depth: int) -> Tuple[str, str]:
+    """Answer from the filename index for the search_dirs it covers.
+
+    A misheard or loosely spoken name ("quarterly report dot pdf") is matched
+    fuzzily against the index when there is one clear winner.
+    """
+    file_index.start()
+    if not file_index.ready.is_set():
+        return None, None
+    for search_dir in [d for d in search_dirs if file_index.covers(d)]:
+        for path in file_index.lookup(filename, under=search_dir):
+            if _depth_below(path, search_dir) <= max_depth and os.path.isfile(path):
+                return path, os.path.dirname(path)
+    matches = []
+    for search_dir in [d for d in search_dirs if file_index.covers(d)]:
+        matches += [(p, s) for p, s in file_index.fuzzy(filename, limit=2, under=search_dir) if _depth_below(p, search_dir) <= max_depth]
+    matches.sort(key=lambda m: m[1], reverse=True)
+    if matches and matches[0][1] >= FILE_FUZZY_ACCEPT and (len(matches) == 1 or matches[0][1] - matches[1][1] >= FILE_FUZZY_MARGIN):
+        if os.path.isfile(matches[0][0]):
+            return matches[0][0], os.path.dirname(matches[0][0])
+    return None, None
+
+async def find_in_roots(filename: str, roots: List[str], max_depth: int) -> Tuple[str, str]:
+    """Walk every root concurrently; the first hit wins and the other walkers are told to stop."""
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    pending = {
+        loop.run_in_executor(
+            _file_search_executor,
+            find_file, filename, root, max_depth, FILE_SEARCH_BUDGET, cancel, tuple(nested_roots(root, roots)),
+        )
+        for root in roots
+    }
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                file_path, found_root = future.result()
+                if file_path:
+                    return file_path, found_root
+        return None, None
+    finally:
+        cancel.set()
+
+def search_roots() -> List[str]:
+    """Where to look when the user names no folder: home plus its well-known subfolders."""
+    return [os.path.abspath(home_dir())] + default_roots()
+
 @function_tool()
-async def find_and_read_file(context: RunContext, filename: str, search_dir: str = ".", max_depth: int = 5, confirm: bool = False) -> str:
-    """Find a file by name and return its contents. Accepts natural language for search_dir. Optionally limits search depth. Asks for confirmation before reading. Handles binary files gracefully."""
-    resolved_dir = infer_path_from_natural_language(search_dir)
-    file_path, found_root = find_file(filename, resolved_dir, max_depth)
+async def find_and_read_file(
+    context: RunContext,
+    filename: str,
+    search_dir: str = "",
+    max_depth: int = 5,
+    confirm: bool = False,
+    offset: Optional[int] = None,
+    from_end: bool = False,
+) -> str:
+    """
+    Find a file by name and return its contents. Accepts natural language for search_dir, or '.' for the current working directory; leave it empty to search home, Documents, Downloads, Desktop, Pictures, Music and Videos at once. Optionally limits search depth. Asks for confirmation before reading. Handles binary files gracefully.
+    PDF, Word, Excel, HTML and Markdown files are read as plain text.
+    Long files are read a part at a time: pass the offset from the previous answer to read the next part, or from_end to read the end of the file.
+    """
+    search_dirs = [infer_path_from_natural_language(search_dir)] if search_dir.strip() else search_roots()
+    where = search_dirs[0] if len(search_dirs) == 1 else "your home folders"
+    file_path, found_root = await asyncio.to_thread(lookup_indexed, filename, search_dirs, max_depth)
     if not file_path:
-        return f"File '{filename}' not found in '{resolved_dir}' (searched up to depth {max_depth})."
+        # Not indexed yet, or created since the last rescan
+        file_path, found_root = await find_in_roots(filename, search_dirs, max_depth)
+    if not file_path:
+        under = search_dirs[0] if len(search_dirs) == 1 else None
+        suggestions = [p for p, _ in file_index.fuzzy(filename, limit=3, under=under)]
+        hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+        return f"File '{filename}' not found in '{where}' (searched up to depth {max_depth}).{hint}"
     # Ask for confirmation if not already confirmed
     if not confirm:
-        return (f"File found: {file_path}\n\nDo you want to read this file? "
+        found = "File found" if os.path.basename(file_path).lower() == filename.lower() else "Closest match"
+        return (f"{found}: {file_path}\n\nDo you want to read this file? "
                 f"If yes, call this tool again with 'confirm=True'.")
-    # Check if file is text
-    if not is_text_file(file_path):
-        return f"File '{file_path}' appears to be binary or not a text file. Reading as text is not supported."
+    extractor = get_extractor(file_path)
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Limit output size for very large files
-            if len(content) > 4000:
-                return f"File '{file_path}' is too large to display in full. Showing first 4000 characters:\n\n{content[:4000]}"
-            return f"File found: {file_path}\n\n{content}"
+        if extractor is not None:
+            # Documents: extracted text, paged by character offset
+            document = await asyncio.to_thread(open_document, file_path, extractor)
+            if from_end and offset is None:
+                chunk = await asyncio.to_thread(document.read_tail, FILE_READ_BUDGET)
+            else:
+                chunk = await asyncio.to_thread(document.read, offset or 0, FILE_READ_BUDGET)
+            unit = "characters"
+        elif not is_text_file(file_path):
+            return f"File '{file_path}' appears to be binary or not a text file. Reading as text is not supported."
+        elif offset is not None:
+            chunk = await asyncio.to_thread(read_range, file_path, offset, FILE_READ_BUDGET)
+            unit = "bytes"
+        elif from_end:
+            chunk = await asyncio.to_thread(read_tail, file_path, FILE_READ_BUDGET)
+            unit = "bytes"
+        else:
+            chunk = await asyncio.to_thread(read_head, file_path, FILE_READ_BUDGET)
+            unit = "bytes"
+    except MissingDependency as e:
+        metrics.registry.record_error()
+        return f"Reading {os.path.splitext(file_path)[1]} files needs the '{e.package}' package (pip install {e.package})."
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error reading file {file_path}: {e}"
+    if chunk.start == 0 and not chunk.more:
+        return f"File found: {file_path}\n\n{chunk.text}"
+    length = f"{chunk.size} {unit}" if chunk.size is not None else "length not known yet"
+    header = f"File '{file_path}' ({length}), showing {unit} {chunk.start}-{chunk.end}."
+    if chunk.more:
+        header += f" To read the next part, call again with offset={chunk.end}."
+    return f"{header}\n\n{chunk.text}"
 
+# --- FILE CONTENT SEARCH ---
+CONTENT_SEARCH_BUDGET = float(os.getenv("CONTENT_SEARCH_BUDGET", "10"))
+# Files bigger than this are skipped (logs, dumps) rather than scanned
+CONTENT_SEARCH_MAX_BYTES = int(float(os.getenv("CONTENT_SEARCH_MAX_MB", "50")) * 1024 * 1024)
+CONTENT_LINE_CHARS = 160
 
-# Persistent notes store
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-NOTES_FILE = os.path.join(BASE_DIR, "notes.json")
+def content_search_paths(search_dirs: List[str], max_depth: int = 5) -> Iterator[str]:
+    """Files to scan: from the filename index where it covers a folder, otherwise a bounded walk."""
+    for search_dir in search_dirs:
+        if file_index.ready.is_set() and file_index.covers(search_dir):
+            yield from file_index.paths(under=search_dir)
+        else:
+            walk = BoundedWalk(search_dir, max_depth=max_depth, exclude=nested_roots(search_dir, search_dirs))
+            yield from (entry.path for entry in walk)
 
-def load_notes():
-    """Load notes from notes.json"""
-    if not os.path.exists(NOTES_FILE):
-        logging.debug(f"[DEBUG] No notes.json found at {NOTES_FILE}, starting fresh.")
-        return []
+def format_file_hits(result: FileHits) -> str:
+    lines = [result.path]
+    for hit in result.hits:
+        if hit.before:
+            lines.append(f"  {hit.line_no - 1}- {clip(hit.before, CONTENT_LINE_CHARS)}")
+        lines.append(f"  {hit.line_no}: {clip(hit.line, CONTENT_LINE_CHARS)}")
+        if hit.after:
+            lines.append(f"  {hit.line_no + 1}- {clip(hit.after, CONTENT_LINE_CHARS)}")
+    return "\n".join(lines)
+
+@function_tool()
+async def search_file_contents(context: RunContext, query: str, search_dir: str = "", limit: int = 5) -> str:
+    """Find files that contain some text and show the matching lines. Accepts natural language for search_dir; leave it empty to search home, Documents, Downloads and Desktop."""
+    if not query.strip():
+        return "Tell me what text to look for."
+    file_index.start()
+    search_dirs = [infer_path_from_natural_language(search_dir)] if search_dir.strip() else search_roots()
+    search = ContentSearch(
+        query,
+        limit=min(max(limit, 1), PAGE_LIMIT_MAX),
+        workers=FILE_SEARCH_WORKERS,
+        budget=CONTENT_SEARCH_BUDGET,
+        max_bytes=CONTENT_SEARCH_MAX_BYTES,
+    )
     try:
-        with open(NOTES_FILE, "r", encoding="utf-8") as f:
-            notes = json.load(f)
-            logging.debug(f"[DEBUG] Loaded notes: {notes}")
-            return notes
-    except json.JSONDecodeError as e:
-        logging.error(f"[ERROR] JSON decode error: {e}, resetting notes.json.")
-        save_notes([])  # Reset the file to an empty list
-        return []
+        results = await asyncio.to_thread(search.run, content_search_paths(search_dirs))
     except Exception as e:
-        logging.error(f"[ERROR] Failed to read {NOTES_FILE}: {e}")
-        return []
+        metrics.registry.record_error()
+        logging.error(f"[ERROR] Content search failed: {e}")
+        return f"Could not search files for '{query}'."
+    logging.debug(f"[DEBUG] Content search for '{query}' scanned {search.files_scanned} file(s)")
+    note = " (stopped early, the search took too long)" if search.timed_out else ""
+    if not results:
+        return f"No files contain '{query}'{note}."
+    return f"Files containing '{query}'{note}:\n\n" + "\n\n".join(format_file_hits(r) for r in results)
+
+# Persistent notes store: timestamped fragments appended to notes.jsonl
+# (an older notes.json is migrated on first use). Its calls take a cross-process
+# file lock and fsync, so the tools run them off the event loop.
+NOTES_FILE = os.path.join(BASE_DIR, "notes.jsonl")
+LEGACY_NOTES_FILE = os.path.join(BASE_DIR, "notes.json")
+notes_store = NotesStore(NOTES_FILE, legacy_path=LEGACY_NOTES_FILE)
 
-def save_notes(notes):
+@function_tool()
+async def write_note(context: RunContext, note: str, note_id: Optional[int] = None, new_note: bool = False) -> str:
+    """Append new info to the last note (or to note number note_id). Set new_note to start a separate note."""
     try:
-        with open(NOTES_FILE, "w", encoding="utf-8") as f:
-            json.dump(notes, f, indent=2, ensure_ascii=False)
-            logging.debug(f"[DEBUG] Saved notes: {notes}")
+        saved_id, created = await asyncio.to_thread(notes_store.append, note, note_id=note_id, new_note=new_note)
+    except ValueError:
+        return "Either give a note number to add to, or start a new note, not both."
+    except KeyError:
+        return f"No note with number {note_id}."
     except Exception as e:
+        metrics.registry.record_error()
         logging.error(f"[ERROR] Failed to save notes: {e}")
+        return "Failed to save the note."
+    logging.debug(f"[DEBUG] {'Added' if created else 'Appended to'} note {saved_id}: {note}")
+    return f"Note {saved_id} added." if created else f"Note {saved_id} updated."
 
 @function_tool()
-async def write_note(context: RunContext, note: str) -> str:
-    """Append new info to the last note, or create a new note if none exist."""
-    notes = load_notes()
-    if notes:
-        notes[-1] = notes[-1].rstrip() + "\n" + note.lstrip()
-        logging.debug(f"[DEBUG] Appended to last note: {note}")
-        msg = "Note updated."
-    else:
-        notes.append(note)
-        logging.debug(f"[DEBUG] Note added: {note}")
-        msg = "Note added."
-    save_notes(notes)
-    return msg
+async def search_notes(context: RunContext, query: str, limit: int = 5) -> str:
+    """Search saved notes by keywords and return the best matching snippets."""
+    try:
+        results = await asyncio.to_thread(notes_store.search, query, limit=max(limit, 1))
+    except Exception as e:
+        metrics.registry.record_error()
+        logging.error(f"[ERROR] Note search failed: {e}")
+        return "Could not search notes."
+    if not results:
+        return f"No notes match '{query}'."
+    return "\n".join(f"{note_id}. {snippet}" for note_id, _, snippet in results)
 
 @function_tool()
-async def show_notes(context: RunContext) -> str:
-    """Show all notes."""
-    notes = load_notes()
-    return "\n".join(f"{i+1}. {n}" for i, n in enumerate(notes)) or "No notes saved."
+async def show_notes(
+    context: RunContext,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+    newest_first: bool = False,
+    summary: bool = False,
+) -> str:
+    """
+    Show saved notes a page at a time. Pass the cursor from a previous answer to hear the next page.
+    Set newest_first to start with the latest notes, or summary for a short overview.
+    """
+    try:
+        note_ids = await asyncio.to_thread(notes_store.note_ids)
+    except Exception as e:
+        metrics.registry.record_error()
+        logging.error(f"[ERROR] Failed to read {NOTES_FILE}: {e}")
+        return "Could not read notes."
+    if not note_ids:
+        return "No notes saved."
+    listing = {"list": "notes", "newest_first": newest_first}
+    try:
+        offset = decode_cursor(cursor, listing) if cursor else max(offset, 0)
+    except ValueError as e:
+        return str(e)
+    if newest_first:
+        note_ids.reverse()
+    limit = SUMMARY_ENTRIES if summary else min(max(limit, 1), PAGE_LIMIT_MAX)
+    # Only the notes on this page get reassembled from their fragments
+    page = await asyncio.to_thread(lambda: [f"{i}. {notes_store.text(i)}" for i in note_ids[offset:offset + limit]])
+    return render_page(page, len(note_ids), offset, "notes", listing, summary)
 
 @function_tool()
 async def generate_password(context: RunContext, length: int = 12) -> str:
@@ -313,27 +727,83 @@ async def generate_password(context: RunContext, length: int = 12) -> str:
     return password
 
 # --- SYSTEM INFORMATION ---
+# Stats are sampled in the background so answering never blocks the event loop
+system_monitor = SystemMonitor(
+    interval=float(os.getenv("SYSTEM_SAMPLE_INTERVAL", "5")),
+    history=float(os.getenv("SYSTEM_HISTORY_MINUTES", "60")) * 60,
+)
+
+def format_rate(bytes_per_second: float) -> str:
+    if bytes_per_second >= 1024 ** 2:
+        return f"{bytes_per_second / 1024 ** 2:.1f}MB/s"
+    return f"{bytes_per_second / 1024:.0f}KB/s"
+
 @function_tool()
-async def get_system_info(context: RunContext) -> str:
-    """Get system information: CPU, RAM, and disk usage."""
-    try:
-        cpu = psutil.cpu_percent(interval=1)
-        ram = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        return (f"CPU Usage: {cpu}%\n"
-                f"RAM Usage: {ram.percent}% ({ram.used // (1024**2)}MB/{ram.total // (1024**2)}MB)\n"
-                f"Disk Usage: {disk.percent}% ({disk.used // (1024**3)}GB/{disk.total // (1024**3)}GB)")
-    except Exception as e:
-        return f"Error getting system info: {e}"
+async def get_system_info(context: RunContext, minutes: int = 0) -> str:
+    """Get system information: CPU, RAM, disk and network usage, and the busiest processes. Set minutes to also hear averages and peaks over that many recent minutes."""
+    system_monitor.start()
+    sample = system_monitor.latest()
+    if sample is None:
+        # Only right after startup: wait briefly for the first reading, off the loop
+        await asyncio.to_thread(system_monitor.ready.wait, 2.0)
+        sample = system_monitor.latest()
+    if sample is None:
+        return "System information is not available yet, please ask again in a moment."
+    lines = [
+        f"CPU Usage: {sample.cpu}%",
+        f"RAM Usage: {sample.ram_percent}% ({sample.ram_used // (1024**2)}MB/{sample.ram_total // (1024**2)}MB)",
+        f"Disk Usage: {sample.disk_percent}% ({sample.disk_used // (1024**3)}GB/{sample.disk_total // (1024**3)}GB)",
+        f"Network: {format_rate(sample.net_recv_rate)} down, {format_rate(sample.net_sent_rate)} up",
+        f"Yogi itself: {sample.proc_cpu:.0f}% CPU, {sample.proc_rss // (1024**2)}MB RAM",
+    ]
+    if sample.top:
+        lines.append("Busiest processes: " + ", ".join(f"{name} ({cpu:.0f}%)" for name, cpu in sample.top))
+    if minutes > 0:
+        trend = system_monitor.trend(minutes)
+        if trend is None or trend.samples < 2:
+            lines.append(f"Not enough history yet for the last {minutes} minutes.")
+        else:
+            lines.append(
+                f"Over the last {trend.minutes:.0f} minutes: CPU average {trend.cpu_avg:.0f}% (peak {trend.cpu_max:.0f}%), "
+                f"RAM average {trend.ram_avg:.0f}% (peak {trend.ram_max:.0f}%), "
+                f"network {format_rate(trend.net_recv_avg)} down and {format_rate(trend.net_sent_avg)} up on average"
+            )
+    return "\n".join(lines)
 
 # --- MATH SOLVER ---
+# Expressions are evaluated in separate worker processes with time, CPU and
+# memory limits, so a pathological input can be killed without stalling the agent.
+math_pool = MathPool(
+    min_workers=int(os.getenv("MATH_MIN_WORKERS", "1")),
+    max_workers=int(os.getenv("MATH_MAX_WORKERS", "4")),
+    timeout=float(os.getenv("MATH_TIMEOUT", "5")),
+    memory_mb=int(os.getenv("MATH_MEMORY_MB", "1024")),
+)
+atexit.register(math_pool.close)
+# Answers are deterministic, so they are cached by canonical spelling: "two times three",
+# "2 x 3" and "2*3" share one entry. Failures and timeouts are not cached.
+math_cache = TTLCache(
+    "math",
+    maxsize=int(os.getenv("MATH_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MATH_CACHE_TTL", "86400")),
+)
+metrics.registry.register_cache(math_cache)
+
 @function_tool()
 async def solve_math(context: RunContext, expression: str) -> str:
-    """Solve a math expression or equation."""
+    """
+    Solve a math expression or equation. Understands requests like "solve x^2 - 4 = 0", "x + y = 3, x - y = 1",
+    "simplify ...", "factor ...", "expand ...", "integrate x^2 from 0 to 1", "derivative of sin(x)" and "x^2 + 1 at x = 3".
+    """
+    key = normalize_expression(expression)
     try:
-        result = sympify(expression)
+        result = await math_cache.get_or_fetch(key, lambda: asyncio.to_thread(math_pool.run, key))
         return f"Result: {result}"
+    except MathTimeout:
+        metrics.registry.record_error()
+        return "That calculation was taking too long, so I stopped it."
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error solving math: {e}"
 
 # --- WIKIPEDIA SUMMARY ---
@@ -348,6 +818,7 @@ async def wikipedia_summary(context: RunContext, topic: str, sentences: int = 2)
     except wikipedia.PageError:
         return "Topic not found."
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error fetching Wikipedia summary: {e}"
 
 # --- NEWS HEADLINES ---
@@ -355,16 +826,16 @@ async def wikipedia_summary(context: RunContext, topic: str, sentences: int = 2)
 async def get_news_headlines(context: RunContext, country: str = 'us', count: int = 5) -> str:
     """Get latest news headlines (top stories)."""
     try:
-        import requests
         url = f'https://newsapi.org/v2/top-headlines?country={country}&pageSize={count}&apiKey=demo'
         # 'demo' API key is rate-limited; for real use, set your own key in .env
-        response = requests.get(url)
+        response = await http_client.get(url)
         data = response.json()
         if data.get('status') != 'ok':
             return f"Error from news API: {data.get('message', 'Unknown error')}"
         headlines = [article['title'] for article in data['articles'][:count]]
         return '\n'.join(headlines) if headlines else 'No headlines found.'
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error fetching news: {e}"
 
 # --- JOKE OR QUOTE OF THE DAY ---
@@ -372,22 +843,22 @@ async def get_news_headlines(context: RunContext, country: str = 'us', count: in
 async def get_joke_or_quote(context: RunContext, type: str = 'joke') -> str:
     """Get a random joke or inspirational quote."""
     try:
-        import requests
         if type == 'joke':
-            resp = requests.get('https://official-joke-api.appspot.com/random_joke')
+            resp = await http_client.get('https://official-joke-api.appspot.com/random_joke')
             if resp.status_code == 200:
                 joke = resp.json()
                 return f"{joke['setup']}\n{joke['punchline']}"
             else:
                 return "Couldn't fetch a joke."
         else:
-            resp = requests.get('https://api.quotable.io/random')
+            resp = await http_client.get('https://api.quotable.io/random')
             if resp.status_code == 200:
                 quote = resp.json()
                 return f"{quote['content']} — {quote['author']}"
             else:
                 return "Couldn't fetch a quote."
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error fetching joke/quote: {e}"
 
 # --- CURRENCY CONVERSION ---
@@ -395,9 +866,8 @@ async def get_joke_or_quote(context: RunContext, type: str = 'joke') -> str:
 async def convert_currency(context: RunContext, amount: float, from_currency: str, to_currency: str) -> str:
     """Convert currency using exchangerate.host (no API key required)."""
     try:
-        import requests
         url = f'https://api.exchangerate.host/convert?from={from_currency.upper()}&to={to_currency.upper()}&amount={amount}'
-        resp = requests.get(url)
+        resp = await http_client.get(url)
         data = resp.json()
         if data.get('success'):
             result = data['result']
@@ -405,6 +875,7 @@ async def convert_currency(context: RunContext, amount: float, from_currency: st
         else:
             return f"Currency conversion failed: {data.get('error', 'Unknown error')}"
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error converting currency: {e}"
 
 # --- UNIT CONVERSION ---
@@ -417,6 +888,7 @@ async def convert_units(context: RunContext, value: float, from_unit: str, to_un
         result = q.to(to_unit)
         return f"{value} {from_unit} = {result.magnitude:.4g} {to_unit}"
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error converting units: {e}"
 
 # --- TIMER AND ALARM ---
@@ -488,6 +960,7 @@ async def get_calendar_events(context: RunContext, days: int = None) -> str:
         return '\n'.join(output)
 
     except Exception as e:
+        metrics.registry.record_error()
         return f"Error fetching calendar events: {e}"
 
 @function_tool()
@@ -557,4 +1030,5 @@ async def add_calendar_event(
         )
 
     except Exception as e:
+        metrics.registry.record_error()
         return f"⚠️ Failed to add event: {e}"